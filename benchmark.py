@@ -0,0 +1,234 @@
+import tracemalloc
+import argparse
+import time
+import numpy as np
+import cv2
+
+import model_loader
+import face_utils
+import bpm
+
+def synthetic_clip(width, height, frames, bpm_value = 72.0, amplitude = 2.0, noise = 2.0, motion = 0.0,
+                   frame_rate = 60, seed = 0):
+    '''
+    Gera uma sequência de recortes (ROI) sintéticos com pulso de frequência conhecida.
+
+    Inputs:
+        width (int) -> Largura dos recortes.
+        height (int) -> Altura dos recortes.
+        frames (int) -> Quantidade de quadros.
+        bpm_value (float) -> Frequência do pulso em BPM.
+        amplitude (float) -> Amplitude do pulso em níveis de cinza.
+        noise (float) -> Desvio padrão do ruído gaussiano em níveis de cinza.
+        motion (float) -> Amplitude (pixels) do movimento da textura da pele.
+        frame_rate (float) -> FPS da sequência.
+        seed (int) -> Semente do gerador aleatório.
+
+    Returns:
+        clip (list) -> Lista de quadros (uint8) com dimensões (height, width, 3).
+    '''
+
+    rng = np.random.default_rng(seed)
+    # Textura de pele maior que o recorte para permitir o movimento
+    margin = int(np.ceil(motion)) + 1
+    skin = np.array([90, 120, 170], dtype = np.float32) + rng.normal(0, 8, (height + 2 * margin, width + 2 * margin, 3))
+    skin = cv2.GaussianBlur(skin.astype(np.float32), (5, 5), 0)
+
+    clip = list()
+    for index in range(frames):
+        t = index / frame_rate
+        # Desloca a textura com um movimento lento e lateral
+        shift = motion * np.sin(2 * np.pi * 0.3 * t)
+        matrix = np.float32([[1, 0, shift - margin], [0, 1, 0.5 * shift - margin]])
+        frame = cv2.warpAffine(skin, matrix, (width, height), borderMode = cv2.BORDER_REFLECT)
+        # Variação de cor do pulso, mais intensa no canal verde
+        pulse = amplitude * np.sin(2 * np.pi * bpm_value / 60.0 * t)
+        frame = frame + np.array([0.5, 1.0, 0.3], dtype = np.float32) * pulse
+        frame = frame + rng.normal(0, noise, frame.shape)
+        clip.append(np.clip(frame, 0, 255).astype(np.uint8))
+
+    return clip
+
+def synthetic_frame(width = 640, height = 480, seed = 0, center = None, size = None):
+    '''
+    Gera um quadro sintético com uma face desenhada para os estágios de detecção e pontos faciais.
+
+    Inputs:
+        width (int) -> Largura do quadro.
+        height (int) -> Altura do quadro.
+        seed (int) -> Semente do gerador aleatório.
+        center (tuple) -> Centro (x, y) da face (padrão: aleatório).
+        size (int) -> Tamanho da face em pixels (padrão: aleatório).
+
+    Returns:
+        frame (array) -> Quadro BGR (uint8).
+        face (tuple) -> Caixa delimitadora (x, y, w, h) da face desenhada.
+    '''
+
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(40, 80, (height, width, 3), dtype = np.uint8)
+    frame = cv2.GaussianBlur(frame, (7, 7), 0)
+
+    # Face: elipse com olhos, sobrancelhas, nariz e boca
+    random_size = int(rng.integers(140, 200))
+    random_center = (int(rng.integers(random_size, width - random_size)), int(rng.integers(random_size, height - random_size)))
+    size = random_size if size is None else size
+    cx, cy = random_center if center is None else center
+    cv2.ellipse(frame, (cx, cy), (int(size * 0.4), int(size * 0.52)), 0, 0, 360, (150, 170, 205), -1)
+    for side in (-1, 1):
+        eye = (cx + side * int(size * 0.16), cy - int(size * 0.1))
+        cv2.ellipse(frame, eye, (int(size * 0.07), int(size * 0.035)), 0, 0, 360, (40, 40, 40), -1)
+        brow = (cx + side * int(size * 0.16), cy - int(size * 0.2))
+        cv2.ellipse(frame, brow, (int(size * 0.09), int(size * 0.02)), 0, 0, 360, (60, 60, 70), -1)
+    cv2.line(frame, (cx, cy - int(size * 0.05)), (cx, cy + int(size * 0.12)), (110, 120, 160), 3)
+    cv2.ellipse(frame, (cx, cy + int(size * 0.25)), (int(size * 0.12), int(size * 0.04)), 0, 0, 360, (70, 70, 140), -1)
+
+    face = (cx - int(size * 0.4), cy - int(size * 0.45), int(size * 0.8), int(size * 0.8))
+    return frame, face
+
+def measure(function, inputs, memory_samples = 30):
+    '''
+    Mede a vazão, a latência e o pico de memória de uma função aplicada a cada entrada. A latência é medida
+    sem o rastreamento de alocações (o tracemalloc torna cada alocação mais lenta e distorce principalmente
+    os estágios mais rápidos); o pico de memória é medido em uma passagem separada sobre as primeiras entradas.
+
+    Inputs:
+        function (callable) -> Função avaliada.
+        inputs (list) -> Entradas passadas, uma a uma, para a função.
+        memory_samples (int) -> Quantidade de entradas da passagem com o rastreamento de alocações.
+
+    Returns:
+        stats (dict) -> Quadros por segundo, percentis de latência (ms), pico de memória (KiB) e
+                        o resultado da última chamada da passagem cronometrada.
+    '''
+
+    latencies = np.zeros(len(inputs))
+    for index, item in enumerate(inputs):
+        start = time.perf_counter()
+        result = function(item)
+        latencies[index] = time.perf_counter() - start
+
+    tracemalloc.start()
+    for item in inputs[:memory_samples]:
+        function(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    return {'fps': len(inputs) / latencies.sum(), 'p50': p50, 'p90': p90, 'p99': p99,
+            'peak_kib': peak / 1024, 'result': result}
+
+def print_row(stage, stats, error = None):
+    '''
+    Imprime uma linha da tabela de resultados.
+    '''
+
+    error_text = '-' if error is None else f'{error:.2f}'
+    print(f'{stage:>34} | {stats["fps"]:10.1f} | {stats["p50"]:8.3f} | {stats["p90"]:8.3f} | '
+          f'{stats["p99"]:8.3f} | {stats["peak_kib"]:10.1f} | {error_text:>9}')
+
+def bench_face(cascade_path, predictor_path, frames = 50):
+    '''
+    Avalia os estágios de detecção facial, pontos faciais e extração das regiões em quadros sintéticos.
+
+    Inputs:
+        cascade_path (str) -> Caminho dos pesos do detector de faces.
+        predictor_path (str) -> Caminho dos pesos do preditor de pontos faciais.
+        frames (int) -> Quantidade de quadros sintéticos.
+    '''
+
+    samples = [synthetic_frame(seed = seed) for seed in range(frames)]
+    grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame, _ in samples]
+
+    face_cascade = cv2.CascadeClassifier(cascade_path)
+    if face_cascade.empty():
+        print(f'{"facial_detection":>34} | modelo não encontrado: {cascade_path}')
+    else:
+        stats = measure(lambda gray: face_utils.facial_detection(gray_image = gray, face_cascade = face_cascade), grays)
+        # Revocação: fração dos quadros em que alguma face detectada sobrepõe a face desenhada
+        found = [any(face_utils.FaceIdentifier.iou(face, truth) > 0.3 for face in
+                     face_utils.facial_detection(gray_image = gray, face_cascade = face_cascade))
+                 for gray, (_, truth) in zip(grays, samples)]
+        print_row('facial_detection', stats)
+        print(f'{"":>34}   revocação nos quadros sintéticos: {np.mean(found):.2f}')
+
+    # Os pontos faciais partem da caixa desenhada para não depender do resultado da detecção
+    try:
+        import dlib
+        predictor = dlib.shape_predictor(predictor_path)
+    except (ImportError, RuntimeError) as error:
+        print(f'{"face_landmarks":>34} | indisponível: {error}')
+        points = [[(truth[0] + truth[2] * 0.3, truth[1] + truth[3] * 0.3), (truth[0] + truth[2] * 0.7, truth[1] + truth[3] * 0.3),
+                   (truth[0] + truth[2] * 0.3, truth[1] + truth[3] * 0.45), (truth[0] + truth[2] * 0.7, truth[1] + truth[3] * 0.45)]
+                  for _, truth in samples]
+    else:
+        pairs = [(gray, np.array([truth])) for gray, (_, truth) in zip(grays, samples)]
+        stats = measure(lambda pair: face_utils.face_landmarks(gray_image = pair[0], faces = pair[1], predictor = predictor), pairs)
+        print_row('face_landmarks', stats)
+        points = [face_utils.get_reference_points(face_utils.face_landmarks(gray_image = gray, faces = faces, predictor = predictor))
+                  for gray, faces in pairs]
+
+    pairs = [(frame, face_utils.get_facial_analisis_coords(points_ref)) for (frame, _), points_ref in zip(samples, points)]
+    stats = measure(lambda pair: face_utils.extract_local_regions(image = pair[0], coords_facial_locals = pair[1]), pairs)
+    print_row('extract_local_regions', stats)
+
+def bench_stages(width, height, clip):
+    '''
+    Avalia separadamente os métodos buildGauss, update e reconstructFrame da BPMFourier.
+    '''
+
+    estimator = bpm.BPMFourier(width, height)
+    stats = measure(lambda frame: estimator.buildGauss(frame, estimator.levels + 1), clip)
+    print_row(f'BPMFourier.buildGauss {width}x{height}', stats)
+
+    level = estimator.buildGauss(clip[0], estimator.levels + 1)[estimator.levels].astype(np.float64)
+    stats = measure(lambda frame: estimator.reconstructFrame([level], 0, estimator.levels), clip)
+    print_row(f'BPMFourier.reconstructFrame {width}x{height}', stats)
+
+def bench_estimators(width, height, clip, true_bpm):
+    '''
+    Avalia a vazão e o erro de BPM de cada estimador para a mesma sequência sintética.
+    '''
+
+    estimators = [bpm.BPMFourier, bpm.BPMSlidingDFT, bpm.BPMTrace, bpm.BPMPreallocated, bpm.BPMLowLatency]
+    for factory in estimators:
+        estimator = factory(width, height)
+        stats = measure(lambda frame: estimator.update(frame), clip)
+        bpm_data = stats['result'][1]
+        error = None if bpm_data is None else abs(bpm_data - true_bpm)
+        print_row(f'{factory.__name__}.update {width}x{height}', stats, error)
+
+def bench_multi_region(sizes, clips, true_bpm):
+    '''
+    Avalia a vazão e o erro de BPM do estimador de múltiplas regiões.
+    '''
+
+    estimator = bpm.BPMMultiRegion(sizes = sizes)
+    stats = measure(lambda regions: estimator.update(regions), list(zip(*clips)))
+    bpm_data = stats['result'][2]
+    error = None if bpm_data is None else abs(bpm_data - true_bpm)
+    print_row('BPMMultiRegion.update (3 regiões)', stats, error)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark sintético de vazão e precisão de cada estágio.')
+    parser.add_argument('--frames', type = int, default = 900, help = 'quadros de cada sequência sintética')
+    parser.add_argument('--bpm', type = float, default = 72.0, help = 'frequência do pulso sintético')
+    parser.add_argument('--amplitude', type = float, default = 2.0, help = 'amplitude do pulso (níveis de cinza)')
+    parser.add_argument('--noise', type = float, default = 2.0, help = 'desvio padrão do ruído (níveis de cinza)')
+    parser.add_argument('--motion', type = float, default = 0.0, help = 'amplitude do movimento (pixels)')
+    parser.add_argument('--cascade', default = model_loader.CASCADE_PATH)
+    parser.add_argument('--predictor', default = model_loader.PREDICTOR_PATH)
+    args = parser.parse_args()
+
+    print(f'{"estágio":>34} | {"quadros/s":>10} | {"p50 ms":>8} | {"p90 ms":>8} | {"p99 ms":>8} | '
+          f'{"pico KiB":>10} | {"erro BPM":>9}')
+
+    bench_face(args.cascade, args.predictor)
+
+    sizes = [(100, 40), (40, 25), (40, 25)]
+    clips = [synthetic_clip(width, height, args.frames, args.bpm, args.amplitude, args.noise, args.motion, seed = seed)
+             for seed, (width, height) in enumerate(sizes)]
+    for (width, height), clip in list(zip(sizes, clips))[:2]:
+        bench_stages(width, height, clip)
+        bench_estimators(width, height, clip, args.bpm)
+    bench_multi_region(sizes, clips, args.bpm)
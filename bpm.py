@@ -1,11 +1,51 @@
+from collections import OrderedDict
 import numpy as np
 import cv2
 
+def lombScargle(times, values, frequencies):
+    '''
+    Periodograma de Lomb-Scargle, que estima o espectro de amostras com espaçamento irregular no tempo.
+
+    Inputs:
+        times (array) -> Instantes (s) de cada amostra.
+        values (array) -> Amostras, com uma coluna por sinal quando houver mais de um.
+        frequencies (array) -> Frequências (Hz) avaliadas.
+
+    Returns:
+        power (array) -> Potência de cada frequência, com uma coluna por sinal quando houver mais de um.
+    '''
+
+    # Centraliza os instantes e remove a componente contínua das amostras
+    t = times - times.mean()
+    y = values - values.mean(axis = 0)
+
+    # Deslocamento de fase (tau) que torna os termos de seno e cosseno ortogonais em cada frequência
+    omega = 2 * np.pi * frequencies[:, None]
+    tau = np.arctan2(np.sin(2 * omega * t).sum(axis = 1), np.cos(2 * omega * t).sum(axis = 1)) / (2 * omega[:, 0])
+    phase = omega * (t - tau[:, None])
+    cos, sin = np.cos(phase), np.sin(phase)
+
+    # Normalização de cada frequência, ajustada para o caso de vários sinais
+    shape = (-1,) + (1,) * (y.ndim - 1)
+    power = 0.5 * ((cos @ y) ** 2 / (cos ** 2).sum(axis = 1).reshape(shape) +
+                   (sin @ y) ** 2 / (sin ** 2).sum(axis = 1).reshape(shape))
+
+    return power
+
 class BPMFourier:
 
-    def __init__(self, width, height) -> None:
+    # Atributos que compõem o estado do estimador (os ausentes em uma subclasse são ignorados)
+    stateArrays = ('videoGauss', 'bandSpectrum', 'trace', 'snrBuffer', 'bpmBuffer', 'timestamps')
+    stateScalars = ('bufferIndex', 'bpmBufferIndex', 'i', 'samples', 'bpm', 'confidence')
+
+    def __init__(self, width, height, frame_rate = 60) -> None:
         '''
         Construtor da classe
+
+        Inputs:
+            width (int) -> Largura da imagem de entrada.
+            height (int) -> Altura da imagem de entrada.
+            frame_rate (float) -> FPS do vídeo de entrada.
         '''
         
         # Define a largura da imagem de entrada
@@ -13,7 +53,7 @@ class BPMFourier:
         # Define a altura da imagem de entrada
         self.height = height
         # FPS da aplicação (informação útil para determinação do filtro passa faixa)
-        self.videoFrameRate = 60
+        self.videoFrameRate = frame_rate
 
         # Quantidade de níveis na pirâmide gaussiana
         self.levels = 3
@@ -28,15 +68,6 @@ class BPMFourier:
         # Inicializando o índice do buffer
         self.bufferIndex = 0
 
-        # Inicializando uma imagem em preto e branco com as dimensões da imagem de entrada
-        self.firstFrame = np.zeros((self.height, self.width, 3))
-        # Construindo a pirâmide gaussiana a partir da imagem inicial
-        self.firstGauss = self.buildGauss(self.firstFrame, self.levels + 1)[self.levels]
-        # Criando um array multidimensional para armazenar os quadros da pirâmide gaussiana ao longo do tempo
-        self.videoGauss = np.zeros((self.bufferSize, self.firstGauss.shape[0], self.firstGauss.shape[1], 3))
-        # Inicializando um array para armazenar a média da transformada de Fourier ao longo do tempo
-        self.fourierTransformAvg = np.zeros((self.bufferSize))
-
         # Sequência de frequências normalizadas
         self.frequencies = (1.0 * self.videoFrameRate) * np.arange(self.bufferSize) / (1.0 * self.bufferSize)
         # Máscara booleana que filtra as frequências da imagem dentro da banda especifificada (filtro passa-banda)
@@ -53,6 +84,54 @@ class BPMFourier:
 
         # Contador que acompanha o número de quadros processados
         self.i = 0
+
+        # Buffer circular com o instante de captura (s) de cada quadro (NaN quando não informado)
+        self.timestamps = np.full((self.bufferSize), np.nan)
+        # Resolução (Hz) da busca pela frequência dominante quando os quadros possuem instante de captura
+        self.scanResolution = 1.0 / 60.0
+
+        # Aloca os buffers utilizados no processamento dos quadros
+        self.initBuffers()
+
+    def initBuffers(self):
+        '''
+        Aloca os buffers de processamento a partir das dimensões e parâmetros definidos no construtor.
+        '''
+
+        # Inicializando uma imagem em preto e branco com as dimensões da imagem de entrada
+        self.firstFrame = np.zeros((self.height, self.width, 3))
+        # Construindo a pirâmide gaussiana a partir da imagem inicial
+        self.firstGauss = self.buildGauss(self.firstFrame, self.levels + 1)[self.levels]
+        # Criando um array multidimensional para armazenar os quadros da pirâmide gaussiana ao longo do tempo
+        self.videoGauss = np.zeros((self.bufferSize, self.firstGauss.shape[0], self.firstGauss.shape[1], 3))
+        # Inicializando um array para armazenar a média da transformada de Fourier ao longo do tempo
+        self.fourierTransformAvg = np.zeros((self.bufferSize))
+
+    def configure(self, **settings):
+        '''
+        Redefine parâmetros do algoritmo (por exemplo, em uma varredura de parâmetros) e reinicia o estimador,
+        recalculando o filtro passa-banda e realocando os buffers.
+
+        Inputs:
+            settings (dict) -> Novos valores de 'levels', 'alpha', 'minFrequency', 'maxFrequency', 'bufferSize',
+                               'bpmCalculationFrequency', 'bpmBufferSize' ou 'videoFrameRate'.
+        '''
+
+        for name, value in settings.items():
+            if name not in ('levels', 'alpha', 'minFrequency', 'maxFrequency', 'bufferSize',
+                            'bpmCalculationFrequency', 'bpmBufferSize', 'videoFrameRate'):
+                raise ValueError(f'Parâmetro desconhecido: {name}')
+            setattr(self, name, value)
+
+        # Recalcula o filtro passa-banda e reinicia os índices e os buffers
+        self.frequencies = (1.0 * self.videoFrameRate) * np.arange(self.bufferSize) / (1.0 * self.bufferSize)
+        self.mask = (self.frequencies >= self.minFrequency) & (self.frequencies <= self.maxFrequency)
+        self.bufferIndex = 0
+        self.bpmBufferIndex = 0
+        self.i = 0
+        self.bpmBuffer = np.zeros((self.bpmBufferSize))
+        self.timestamps = np.full((self.bufferSize), np.nan)
+        self.initBuffers()
         
     def buildGauss(self, frame, levels):
         '''
@@ -102,6 +181,129 @@ class BPMFourier:
         filteredFrame = filteredFrame[:self.height, :self.width]
         return filteredFrame
     
+    def storeTimestamp(self, timestamp):
+        '''
+        Armazena o instante de captura do quadro na posição atual do buffer.
+
+        Inputs:
+            timestamp (float) -> Instante de captura (s) do quadro ou None se não for informado.
+        '''
+
+        self.timestamps[self.bufferIndex] = np.nan if timestamp is None else timestamp
+
+    def timestampSpectrum(self, trace):
+        '''
+        Estima o espectro da banda do filtro passa-faixa a partir das amostras que possuem instante de captura,
+        sem supor que os quadros chegam na taxa 'videoFrameRate'.
+
+        Inputs:
+            trace (array) -> Sinal armazenado no buffer circular, com uma coluna por sinal quando houver mais de um.
+
+        Returns:
+            frequencies (array) -> Frequências (Hz) avaliadas dentro da banda.
+            power (array) -> Potência de cada frequência ou None se não houver amostras suficientes.
+        '''
+
+        frequencies = np.arange(self.minFrequency, self.maxFrequency + self.scanResolution / 2, self.scanResolution)
+        valid = np.isfinite(self.timestamps)
+        # São necessárias amostras em instantes distintos para estimar o espectro
+        if valid.sum() < 3 or np.ptp(self.timestamps[valid]) <= 0: return frequencies, None
+
+        return frequencies, lombScargle(self.timestamps[valid], trace[valid], frequencies)
+
+    def storeBpm(self, fourierTransformAvg, frequencies = None):
+        '''
+        Determina o BPM a partir da média da transformada de Fourier e o armazena no buffer de BPM.
+
+        Inputs:
+            fourierTransformAvg (array) -> Média das amplitudes reais de cada frequência da transformada
+                                           (uma coluna por região, quando houver mais de uma).
+            frequencies (array) -> Frequências (Hz) de cada linha de 'fourierTransformAvg' (padrão: self.frequencies).
+        '''
+
+        if frequencies is None: frequencies = self.frequencies
+
+        # Incrementa o contador de iterações
+        self.i = self.i + 1
+        # Determina a frequência dominante (Hz) com maior amplitude na transformada de Fourier
+        hz = frequencies[np.argmax(fourierTransformAvg, axis = 0)]
+        # Calcula o BPM correspondente à frequência dominante
+        bpm = 60.0 * hz
+        # Armazena o valor do BPM calculado no buffer
+        self.bpmBuffer[self.bpmBufferIndex] = bpm
+        # Atualiza o índice do buffer circular para o próximo valor
+        self.bpmBufferIndex = (self.bpmBufferIndex + 1) % self.bpmBufferSize
+
+    def currentBpm(self):
+        '''
+        Obtém o BPM médio armazenado no buffer.
+
+        Returns:
+            bpm_data (float) -> Valor do BPM calculado ou None se o cálculo ainda não estiver completo.
+        '''
+
+        # Verifica se já passou do número máximo de iterações para calcular o BPM
+        if self.i > self.bpmBufferSize:
+            # Calcula a média dos valores de BPM armazenados no buffer
+            return self.bpmBuffer.mean(axis = 0)
+        
+        # Retorna None se o cálculo do BPM ainda não estiver completo
+        return None
+
+    def stateConfig(self):
+        '''
+        Obtém a configuração que determina a geometria do estado (utilizada para validar uma restauração).
+
+        Returns:
+            config (dict) -> Classe do estimador, dimensões, FPS e parâmetros do filtro e dos buffers.
+        '''
+
+        return {'estimator': type(self).__name__, 'width': self.width, 'height': self.height,
+                'sizes': [list(size) for size in getattr(self, 'sizes', [])], 'magnify': getattr(self, 'magnify', True),
+                'videoFrameRate': float(self.videoFrameRate), 'levels': self.levels,
+                'minFrequency': self.minFrequency, 'maxFrequency': self.maxFrequency, 'bufferSize': self.bufferSize,
+                'bpmBufferSize': self.bpmBufferSize, 'bpmCalculationFrequency': self.bpmCalculationFrequency}
+
+    def getState(self):
+        '''
+        Obtém o estado do estimador sem copiá-lo.
+
+        Returns:
+            arrays (dict) -> Buffers do estado (referências aos arrays do estimador).
+            scalars (dict) -> Índices e contadores do estado.
+        '''
+
+        arrays = {name: getattr(self, name) for name in self.stateArrays if isinstance(getattr(self, name, None), np.ndarray)}
+        scalars = {name: getattr(self, name) for name in self.stateScalars if hasattr(self, name)}
+        scalars = {name: None if value is None else value.item() if isinstance(value, np.generic) else value
+                   for name, value in scalars.items()}
+        return arrays, scalars
+
+    def setState(self, config, arrays, scalars):
+        '''
+        Restaura um estado obtido por 'getState', verificando a configuração e as dimensões dos buffers.
+
+        Inputs:
+            config (dict) -> Configuração do estimador que gerou o estado ('stateConfig').
+            arrays (dict) -> Buffers do estado.
+            scalars (dict) -> Índices e contadores do estado.
+        '''
+
+        current = self.stateConfig()
+        mismatched = [name for name in current if config.get(name) != current[name]]
+        if mismatched:
+            raise ValueError(f'Estado incompatível com a configuração atual: {", ".join(mismatched)}')
+
+        ownArrays, ownScalars = self.getState()
+        if set(arrays) != set(ownArrays) or set(scalars) != set(ownScalars):
+            raise ValueError('Estado incompatível: buffers diferentes dos do estimador.')
+        for name, array in arrays.items():
+            if array.shape != ownArrays[name].shape:
+                raise ValueError(f'Estado incompatível: dimensões de {name} {array.shape} != {ownArrays[name].shape}')
+
+        for name, array in arrays.items(): np.copyto(ownArrays[name], array)
+        for name, value in scalars.items(): setattr(self, name, value)
+
     def update(self, frame):
         '''
         Atualiza o processamento do algoritmo para um novo quadro de imagem.
@@ -124,19 +326,11 @@ class BPMFourier:
 
         # Verifica se é necessário calcular o BPM neste quadro
         if self.bufferIndex % self.bpmCalculationFrequency == 0:
-            # Incrementa o contador de iterações
-            self.i = self.i + 1
             # Calcula a média das amplitudes reais da transformada de Fourier ao longo do tempo
             for buf in range(self.bufferSize):
                 self.fourierTransformAvg[buf] = np.real(fourierTransform[buf]).mean()
-            # Determina a frequência dominante (Hz) com maior amplitude na transformada de Fourier
-            hz = self.frequencies[np.argmax(self.fourierTransformAvg)]
-            # Calcula o BPM correspondente à frequência dominante
-            bpm = 60.0 * hz
-            # Armazena o valor do BPM calculado no buffer
-            self.bpmBuffer[self.bpmBufferIndex] = bpm
-            # Atualiza o índice do buffer circular para o próximo valor
-            self.bpmBufferIndex = (self.bpmBufferIndex + 1) % self.bpmBufferSize
+            # Armazena o BPM correspondente à frequência dominante
+            self.storeBpm(self.fourierTransformAvg)
         
         # Calcula o sinal filtrado invertendo a transformada de Fourier
         filtered = np.real(np.fft.ifft(fourierTransform, axis=0))
@@ -153,12 +347,765 @@ class BPMFourier:
         # Atualiza o índice do buffer circular para o próximo quadro
         self.bufferIndex = (self.bufferIndex + 1) % self.bufferSize
 
-        # Verifica se já passou do número máximo de iterações para calcular o BPM
-        if self.i > self.bpmBufferSize:
-            # Calcula a média dos valores de BPM armazenados no buffer
-            bpm_data = self.bpmBuffer.mean()
+        return outputFrame, self.currentBpm()
+
+
+class BPMSlidingDFT(BPMFourier):
+    '''
+    Estimador que mantém apenas as frequências dentro da banda do filtro passa-faixa,
+    atualizadas de forma recursiva (sliding DFT) a cada novo quadro.
+    '''
+
+    def initBuffers(self):
+        '''
+        Aloca os buffers de processamento e o espectro das frequências da banda.
+        '''
+
+        super().initBuffers()
+
+        # Índices das frequências que pertencem à banda do filtro passa-banda
+        self.bandIndexes = np.flatnonzero(self.mask)
+        # Fatores de rotação (twiddle factors) da DFT para cada frequência da banda e cada posição do buffer
+        self.twiddles = np.exp(-2j * np.pi * np.outer(self.bandIndexes, np.arange(self.bufferSize)) / self.bufferSize)
+        # Espectro das frequências da banda para cada pixel do nível da pirâmide gaussiana
+        self.bandSpectrum = np.zeros((len(self.bandIndexes), self.firstGauss.shape[0], self.firstGauss.shape[1], 3),
+                                     dtype = np.complex128)
+
+    def updateSpectrum(self, level):
+        '''
+        Armazena o nível da pirâmide na posição atual do buffer e atualiza o espectro da banda.
+
+        Inputs:
+            level (array) -> Nível da pirâmide gaussiana do novo quadro.
+        '''
+
+        # Diferença entre o novo quadro e o quadro que sai do buffer nesta posição
+        delta = level - self.videoGauss[self.bufferIndex]
+        self.videoGauss[self.bufferIndex] = level
+
+        # Atualiza recursivamente o espectro: X_k += (x_novo - x_antigo) * exp(-2j*pi*k*n/N)
+        twiddles = self.twiddles[:, self.bufferIndex].reshape((-1,) + (1,) * delta.ndim)
+        self.bandSpectrum += twiddles * delta
+
+    def magnifyFrame(self, frame):
+        '''
+        Obtém o quadro magnificado da posição atual do buffer a partir do espectro da banda.
+
+        Inputs:
+            frame (array) -> Quadro de imagem original.
+
+        Returns:
+            outputFrame (array) -> Quadro de imagem processado.
+        '''
+
+        # Calcula a transformada inversa apenas para a posição atual do buffer a partir das frequências da banda
+        twiddles = np.conj(self.twiddles[:, self.bufferIndex])
+        filtered = np.real(np.tensordot(twiddles, self.bandSpectrum, axes = 1)) / self.bufferSize
+        # Amplifica o sinal filtrado pela constante alpha
+        filtered = filtered * self.alpha
+
+        # Reconstrói o quadro resultante a partir do sinal filtrado
+        filteredFrame = self.reconstructFrame([filtered], 0, self.levels)
+        # Adiciona o quadro original ao quadro resultante e converte para 8 bits sem sinal (0-255)
+        return cv2.convertScaleAbs(frame + filteredFrame)
+
+    def update(self, frame):
+        '''
+        Atualiza o processamento do algoritmo para um novo quadro de imagem. Produz o mesmo resultado
+        de BPMFourier.update, mas atualiza somente as frequências da banda com o quadro que entrou no buffer,
+        sem recalcular a transformada de Fourier de todo o buffer.
+
+        Inputs:
+            frame (array) -> O novo quadro da imagem a ser processado.
+        
+        Returns:
+            outputFrame (array) -> Quadro de imagem processado.
+            bpm_data (float) -> Valor do BPM calculado.
+        '''
+
+        # Constrói a pirâmide gaussiana e atualiza o espectro com o nível desejado
+        self.updateSpectrum(self.buildGauss(frame, self.levels+1)[self.levels])
+
+        # Verifica se é necessário calcular o BPM neste quadro
+        if self.bufferIndex % self.bpmCalculationFrequency == 0:
+            # As frequências fora da banda são nulas após o filtro passa-banda
+            self.fourierTransformAvg[:] = 0
+            # Calcula a média das amplitudes reais somente das frequências da banda
+            self.fourierTransformAvg[self.bandIndexes] = np.real(self.bandSpectrum).mean(axis = (1, 2, 3))
+            # Armazena o BPM correspondente à frequência dominante
+            self.storeBpm(self.fourierTransformAvg)
+
+        # Reconstrói o quadro magnificado da posição atual do buffer
+        outputFrame = self.magnifyFrame(frame)
+
+        # Atualiza o índice do buffer circular para o próximo quadro
+        self.bufferIndex = (self.bufferIndex + 1) % self.bufferSize
+
+        return outputFrame, self.currentBpm()
+
+
+class BPMPreallocated(BPMSlidingDFT):
+    '''
+    Estimador com DFT deslizante em precisão simples (float32/complex64) e sem alocações por quadro.
+    Todos os buffers (níveis da pirâmide gaussiana, espectro, sinal filtrado e quadro de saída) são alocados
+    no construtor e reutilizados a cada chamada de 'update', com as operações escritas no lugar através dos
+    argumentos 'dst' e 'out'. A pirâmide gaussiana é construída sobre o quadro no seu tipo original (uint8),
+    como na BPMSlidingDFT, para que o arredondamento de cada nível seja o mesmo. O quadro de saída é
+    reutilizado entre as chamadas e deve ser copiado pelo chamador caso precise ser mantido.
+    '''
+
+    def initBuffers(self):
+        '''
+        Aloca todos os buffers de processamento em precisão simples.
+        '''
+
+        super().initBuffers()
+        # O quadro inicial só é necessário para obter as dimensões do nível analisado
+        del self.firstFrame
+
+        # Dimensões de cada nível da pirâmide gaussiana, do quadro original até o nível analisado
+        shapes = [(self.height, self.width)]
+        for _ in range(self.levels):
+            shapes.append(((shapes[-1][0] + 1) // 2, (shapes[-1][1] + 1) // 2))
+        self.levelShapes = shapes[1:]
+
+        # Níveis da pirâmide gaussiana (pyrDown) no tipo dos quadros de entrada (realocados se o tipo mudar)
+        self.pyramidBuffers = [np.zeros(shape + (3,), dtype = np.uint8) for shape in self.levelShapes]
+        # Níveis da reconstrução do quadro filtrado (pyrUp), cada um com o dobro das dimensões do anterior
+        self.reconstructBuffers = [np.zeros((shapes[-1][0] * 2 ** level, shapes[-1][1] * 2 ** level, 3),
+                                            dtype = np.float32) for level in range(1, self.levels + 1)]
+
+        # Buffer de vídeo, fatores de rotação e espectro da banda em precisão simples
+        self.videoGauss = self.videoGauss.astype(np.float32)
+        self.twiddles = self.twiddles.astype(np.complex64)
+        self.inverseTwiddles = np.conj(self.twiddles)
+        # Fatores de cada posição do buffer como colunas contíguas (K, 1) para o produto pela diferença
+        self.columnTwiddles = np.ascontiguousarray(self.twiddles.T)[:, :, None]
+        self.bandSpectrum = self.bandSpectrum.astype(np.complex64)
+
+        # Buffers temporários do nível analisado: nível e diferença entre quadros (a diferença é mantida em
+        # complex64 para que a multiplicação pelas frequências da banda não precise de buffers de conversão),
+        # produto de todas as frequências da banda pela diferença e transformada inversa da posição atual
+        pixels = shapes[-1][0] * shapes[-1][1] * 3
+        self.level = np.zeros(shapes[-1] + (3,), dtype = np.float32)
+        self.delta = np.zeros(shapes[-1] + (3,), dtype = np.float32)
+        self.complexDelta = np.zeros((1, pixels), dtype = np.complex64)
+        self.product = np.zeros((len(self.bandIndexes), pixels), dtype = np.complex64)
+        self.inverse = np.zeros(pixels, dtype = np.complex64)
+        self.filtered = np.zeros(shapes[-1] + (3,), dtype = np.float32)
+        # Soma do quadro original com o quadro filtrado e quadro de saída em 8 bits
+        self.sumFrame = np.zeros((self.height, self.width, 3), dtype = np.float32)
+        self.outputFrame = np.zeros((self.height, self.width, 3), dtype = np.uint8)
+
+    def updateSpectrum(self, level):
+        '''
+        Armazena o nível da pirâmide na posição atual do buffer e atualiza o espectro da banda no lugar.
+        A cada volta completa do buffer o espectro é recalculado a partir do buffer de vídeo, eliminando o
+        erro acumulado pela atualização recursiva em precisão simples.
+
+        Inputs:
+            level (array) -> Nível da pirâmide gaussiana do novo quadro.
+        '''
+
+        # Diferença entre o novo quadro e o quadro que sai do buffer nesta posição
+        np.copyto(self.level, level)
+        np.subtract(self.level, self.videoGauss[self.bufferIndex], out = self.delta)
+        np.copyto(self.videoGauss[self.bufferIndex], self.level)
+
+        spectrum = self.bandSpectrum.reshape(len(self.bandIndexes), -1)
+        if self.bufferIndex == 0:
+            # Recalcula o espectro da banda diretamente a partir do buffer de vídeo
+            np.dot(self.twiddles, self.videoGauss.reshape(self.bufferSize, -1), out = spectrum)
+            return
+
+        # Atualiza recursivamente todas as frequências da banda: X_k += (x_novo - x_antigo) * exp(-2j*pi*k*n/N),
+        # com o produto de todas as frequências pela diferença calculado como um único produto matricial (K, 1) x (1, P)
+        np.copyto(self.complexDelta.real, self.delta.reshape(1, -1))
+        np.dot(self.columnTwiddles[self.bufferIndex], self.complexDelta, out = self.product)
+        np.add(spectrum, self.product, out = spectrum)
+
+    def magnifyFrame(self, frame):
+        '''
+        Obtém o quadro magnificado da posição atual do buffer, escrevendo nos buffers pré-alocados.
+
+        Inputs:
+            frame (array) -> Quadro de imagem original.
+
+        Returns:
+            outputFrame (array) -> Quadro de imagem processado (buffer reutilizado entre as chamadas).
+        '''
+
+        # Transformada inversa da posição atual: Re(sum_k X_k * exp(2j*pi*k*n/N)) * alpha / N
+        np.dot(self.inverseTwiddles[:, self.bufferIndex], self.bandSpectrum.reshape(len(self.bandIndexes), -1),
+               out = self.inverse)
+        np.multiply(self.inverse.real.reshape(self.filtered.shape), self.alpha / self.bufferSize,
+                    out = self.filtered)
+
+        # Reconstrói o quadro a partir do sinal filtrado (pyrUp) nos buffers pré-alocados
+        filteredFrame = self.filtered
+        for buffer in self.reconstructBuffers:
+            filteredFrame = cv2.pyrUp(filteredFrame, dst = buffer)
+
+        # Adiciona o quadro original ao quadro resultante e converte para 8 bits sem sinal (0-255)
+        np.copyto(self.sumFrame, frame)
+        cv2.add(self.sumFrame, filteredFrame[:self.height, :self.width], dst = self.sumFrame)
+        return cv2.convertScaleAbs(self.sumFrame, dst = self.outputFrame)
+
+    def update(self, frame):
+        '''
+        Atualiza o processamento do algoritmo para um novo quadro de imagem sem alocar memória por quadro.
+
+        Inputs:
+            frame (array) -> O novo quadro da imagem a ser processado.
+        
+        Returns:
+            outputFrame (array) -> Quadro de imagem processado (buffer reutilizado entre as chamadas).
+            bpm_data (float) -> Valor do BPM calculado.
+        '''
+
+        # Os níveis da pirâmide seguem o tipo do quadro de entrada, como na construção da BPMSlidingDFT
+        if self.pyramidBuffers[0].dtype != frame.dtype:
+            self.pyramidBuffers = [np.zeros(shape + (3,), dtype = frame.dtype) for shape in self.levelShapes]
+
+        # Constrói a pirâmide gaussiana no lugar a partir do quadro original
+        source = frame
+        for destination in self.pyramidBuffers:
+            source = cv2.pyrDown(source, dst = destination)
+
+        # Atualiza o espectro com o nível desejado
+        self.updateSpectrum(self.pyramidBuffers[-1])
+
+        # Verifica se é necessário calcular o BPM neste quadro
+        if self.bufferIndex % self.bpmCalculationFrequency == 0:
+            # As frequências fora da banda são nulas após o filtro passa-banda
+            self.fourierTransformAvg[:] = 0
+            # Calcula a média das amplitudes reais somente das frequências da banda
+            self.fourierTransformAvg[self.bandIndexes] = self.bandSpectrum.real.mean(axis = (1, 2, 3))
+            # Armazena o BPM correspondente à frequência dominante
+            self.storeBpm(self.fourierTransformAvg)
+
+        # Reconstrói o quadro magnificado da posição atual do buffer
+        outputFrame = self.magnifyFrame(frame)
+
+        # Atualiza o índice do buffer circular para o próximo quadro
+        self.bufferIndex = (self.bufferIndex + 1) % self.bufferSize
+
+        return outputFrame, self.currentBpm()
+
+
+class BPMTrace(BPMSlidingDFT):
+    '''
+    Estimador leve que armazena apenas a média espacial de cada canal do nível da pirâmide gaussiana.
+    Como a transformada de Fourier é linear, a média das amplitudes reais de cada frequência sobre todos
+    os pixels é igual à transformada da média espacial, e o BPM obtido é o mesmo da BPMFourier.
+    O buffer de vídeo e a transformada inversa só são utilizados quando o quadro magnificado é solicitado.
+    '''
+
+    def __init__(self, width, height, magnify = False, frame_rate = 60) -> None:
+        '''
+        Construtor da classe
+
+        Inputs:
+            width (int) -> Largura da imagem de entrada.
+            height (int) -> Altura da imagem de entrada.
+            magnify (bool) -> Se verdadeiro, também calcula o quadro magnificado em cada atualização.
+            frame_rate (float) -> FPS do vídeo de entrada.
+        '''
+
+        # Define se o quadro magnificado deve ser calculado
+        self.magnify = magnify
+
+        super().__init__(width, height, frame_rate)
+
+    def initBuffers(self):
+        '''
+        Aloca o buffer circular das médias espaciais e, se necessário, os buffers de magnificação.
+        '''
+
+        if self.magnify:
+            super().initBuffers()
+        else:
+            # Inicializando um array para armazenar a média da transformada de Fourier ao longo do tempo
+            self.fourierTransformAvg = np.zeros((self.bufferSize))
+
+        # Buffer circular com a média espacial de cada canal do nível da pirâmide gaussiana
+        self.trace = np.zeros((self.bufferSize, 3))
+
+    def update(self, frame, timestamp = None):
+        '''
+        Atualiza o processamento do algoritmo para um novo quadro de imagem.
+
+        Inputs:
+            frame (array) -> O novo quadro da imagem a ser processado.
+            timestamp (float) -> Instante de captura (s) do quadro. Quando informado, o BPM é estimado pelo
+                                 periodograma de Lomb-Scargle, que tolera quadros descartados e taxas de
+                                 processamento diferentes de 'videoFrameRate'.
+        
+        Returns:
+            outputFrame (array) -> Quadro de imagem processado ou None se a magnificação estiver desativada.
+            bpm_data (float) -> Valor do BPM calculado.
+        '''
+
+        # Constrói a pirâmide gaussiana e armazena a média de cada canal do nível desejado
+        level = self.buildGauss(frame, self.levels+1)[self.levels]
+        self.trace[self.bufferIndex] = level.mean(axis = (0, 1))
+        self.storeTimestamp(timestamp)
+
+        # Verifica se é necessário calcular o BPM neste quadro
+        if self.bufferIndex % self.bpmCalculationFrequency == 0:
+            if timestamp is not None:
+                # Estima o espectro a partir dos instantes de captura e armazena o BPM da frequência dominante
+                frequencies, power = self.timestampSpectrum(self.trace.mean(axis = 1))
+                if power is not None: self.storeBpm(power, frequencies)
+            else:
+                # Aplica a transformada de Fourier à média espacial ao longo do tempo
+                fourierTransform = np.fft.fft(self.trace.mean(axis = 1))
+                # Aplica o filtro passa-banda e armazena o BPM correspondente à frequência dominante
+                self.fourierTransformAvg[:] = np.where(self.mask, np.real(fourierTransform), 0)
+                self.storeBpm(self.fourierTransformAvg)
+
+        outputFrame = None
+        if self.magnify:
+            # Atualiza o espectro da banda e reconstrói o quadro magnificado
+            self.updateSpectrum(level)
+            outputFrame = self.magnifyFrame(frame)
+
+        # Atualiza o índice do buffer circular para o próximo quadro
+        self.bufferIndex = (self.bufferIndex + 1) % self.bufferSize
+
+        return outputFrame, self.currentBpm()
+
+
+class BPMLowLatency(BPMTrace):
+    '''
+    Estimador de baixa latência baseado na média espacial. Emite um BPM provisório assim que 'minWindow'
+    quadros são acumulados e o atualiza a cada 'hopSize' quadros com a janela mais recente. O pico é
+    refinado entre as raias da FFT por uma DFT com zoom (avaliada apenas na banda do filtro passa-faixa, com
+    resolução 'scanResolution') seguida de interpolação parabólica, e cada leitura acompanha uma confiança
+    entre 0 e 1 (potência do pico em relação à de uma senoide pura com a mesma energia da janela).
+    '''
+
+    def __init__(self, width, height, magnify = False, frame_rate = 60, min_window = 90, hop_size = 10) -> None:
+        '''
+        Construtor da classe
+
+        Inputs:
+            width (int) -> Largura da imagem de entrada.
+            height (int) -> Altura da imagem de entrada.
+            magnify (bool) -> Se verdadeiro, também calcula o quadro magnificado em cada atualização.
+            frame_rate (float) -> FPS do vídeo de entrada.
+            min_window (int) -> Quantidade mínima de quadros para emitir o primeiro BPM.
+            hop_size (int) -> Quantidade de quadros entre duas estimativas.
+        '''
+
+        # Tamanho mínimo da janela e intervalo (em quadros) entre duas estimativas
+        self.minWindow = min_window
+        self.hopSize = hop_size
+
+        super().__init__(width, height, magnify, frame_rate)
+
+    def initBuffers(self):
+        '''
+        Aloca o buffer das médias espaciais, o núcleo da DFT com zoom e reinicia a última leitura.
+        '''
+
+        super().initBuffers()
+
+        # Frequências avaliadas pela DFT com zoom
+        self.scanFrequencies = np.arange(self.minFrequency, self.maxFrequency + self.scanResolution / 2, self.scanResolution)
+        # Núcleo da DFT com zoom para quadros igualmente espaçados em 'videoFrameRate'
+        self.zoomKernel = np.exp(-2j * np.pi * np.outer(self.scanFrequencies, np.arange(self.bufferSize)) / self.videoFrameRate)
+
+        # Quantidade de quadros recebidos e última leitura (BPM e confiança)
+        self.samples = 0
+        self.bpm = None
+        self.confidence = 0.0
+
+    def estimate(self, timed):
+        '''
+        Estima o BPM e a confiança a partir da janela mais recente do buffer.
+
+        Inputs:
+            timed (bool) -> Se verdadeiro, utiliza os instantes de captura em vez de 'videoFrameRate'.
+
+        Returns:
+            bpm (float) -> BPM estimado (a leitura anterior se não houver amostras com instante suficientes).
+            confidence (float) -> Confiança da estimativa (0 a 1).
+        '''
+
+        # Amostras da janela em ordem temporal
+        length = min(self.samples, self.bufferSize)
+        order = (self.bufferIndex + 1 - length + np.arange(length)) % self.bufferSize
+        if timed:
+            # Apenas as amostras com instante de captura entram no núcleo, como em 'timestampSpectrum'
+            order = order[np.isfinite(self.timestamps[order])]
+            if len(order) < 3 or np.ptp(self.timestamps[order]) <= 0: return self.bpm, self.confidence
+            length = len(order)
+
+        # Remove a componente contínua e aplica a janela de Hann
+        window = np.hanning(length)
+        signal = self.trace[order].mean(axis = 1)
+        signal = (signal - signal.mean()) * window
+
+        # DFT com zoom avaliada apenas nas frequências da banda
+        if timed:
+            times = self.timestamps[order] - self.timestamps[order[0]]
+            kernel = np.exp(-2j * np.pi * np.outer(self.scanFrequencies, times))
         else:
-            # Retorna None se o cálculo do BPM ainda não estiver completo# Retorna None se o cálculo do BPM ainda não estiver completo
-            bpm_data = None
+            kernel = self.zoomKernel[:, :length]
+        power = np.abs(kernel @ signal) ** 2
+
+        # Interpolação parabólica do pico entre as frequências avaliadas
+        peak = int(np.argmax(power))
+        offset = 0.0
+        if 0 < peak < len(power) - 1:
+            a, b, c = power[peak - 1], power[peak], power[peak + 1]
+            if a - 2 * b + c != 0: offset = 0.5 * (a - c) / (a - 2 * b + c)
+        hz = self.scanFrequencies[peak] + offset * self.scanResolution
+
+        # Confiança: uma senoide pura com janela w concentra no pico |X|^2 = energia * (sum w)^2 / (2 * sum w^2)
+        energy = (signal ** 2).sum()
+        confidence = 0.0
+        if energy > 0:
+            confidence = min(1.0, power[peak] * 2 * (window ** 2).sum() / (window.sum() ** 2 * energy))
+
+        return 60.0 * hz, float(confidence)
+
+    def update(self, frame, timestamp = None):
+        '''
+        Atualiza o processamento do algoritmo para um novo quadro de imagem.
+
+        Inputs:
+            frame (array) -> O novo quadro da imagem a ser processado.
+            timestamp (float) -> Instante de captura (s) do quadro.
         
-        return outputFrame, bpm_data
\ No newline at end of file
+        Returns:
+            outputFrame (array) -> Quadro de imagem processado ou None se a magnificação estiver desativada.
+            bpm_data (float) -> BPM da leitura mais recente ou None antes de 'minWindow' quadros.
+            confidence (float) -> Confiança da leitura mais recente (0 a 1).
+        '''
+
+        # Constrói a pirâmide gaussiana e armazena a média de cada canal do nível desejado
+        level = self.buildGauss(frame, self.levels+1)[self.levels]
+        self.trace[self.bufferIndex] = level.mean(axis = (0, 1))
+        self.storeTimestamp(timestamp)
+        self.samples += 1
+
+        # Estima o BPM a cada 'hopSize' quadros depois que a janela mínima for preenchida
+        if self.samples >= self.minWindow and (self.samples - self.minWindow) % self.hopSize == 0:
+            self.bpm, self.confidence = self.estimate(timed = timestamp is not None)
+
+        outputFrame = None
+        if self.magnify:
+            # Atualiza o espectro da banda e reconstrói o quadro magnificado
+            self.updateSpectrum(level)
+            outputFrame = self.magnifyFrame(frame)
+
+        # Atualiza o índice do buffer circular para o próximo quadro
+        self.bufferIndex = (self.bufferIndex + 1) % self.bufferSize
+
+        return outputFrame, self.bpm, self.confidence
+
+
+class BPMMultiRegion(BPMSlidingDFT):
+    '''
+    Estimador único para várias regiões faciais (testa e bochechas). Os níveis da pirâmide gaussiana de
+    todas as regiões são empacotados em um único buffer contíguo, de modo que cada quadro realiza apenas uma
+    atualização do espectro para todas as regiões. O BPM final combina os BPMs das regiões ponderados pela
+    relação sinal-ruído (SNR) de cada uma.
+    '''
+
+    def __init__(self, sizes = ((100, 40), (40, 25), (40, 25)), magnify = False, frame_rate = 60) -> None:
+        '''
+        Construtor da classe
+
+        Inputs:
+            sizes (list) -> Lista com as dimensões (largura, altura) de cada região analisada.
+            magnify (bool) -> Se verdadeiro, também calcula os quadros magnificados de cada região.
+            frame_rate (float) -> FPS do vídeo de entrada.
+        '''
+
+        # Dimensões padronizadas de cada região
+        self.sizes = [(int(width), int(height)) for (width, height) in sizes]
+        # Define se os quadros magnificados devem ser calculados
+        self.magnify = magnify
+
+        # As dimensões de referência da classe base são as da primeira região
+        super().__init__(width = self.sizes[0][0], height = self.sizes[0][1], frame_rate = frame_rate)
+
+    def initBuffers(self):
+        '''
+        Aloca o buffer contíguo com os níveis da pirâmide gaussiana de todas as regiões.
+        '''
+
+        # Dimensões do nível da pirâmide gaussiana de cada região
+        self.levelShapes = [self.buildGauss(np.zeros((height, width, 3)), self.levels + 1)[self.levels].shape[:2]
+                            for (width, height) in self.sizes]
+        # Quantidade de pixels e posição inicial de cada região no buffer empacotado
+        self.regionPixels = np.array([h * w for (h, w) in self.levelShapes])
+        self.regionOffsets = np.concatenate(([0], np.cumsum(self.regionPixels)[:-1]))
+        totalPixels = int(self.regionPixels.sum())
+
+        # Buffer empacotado com os pixels de todas as regiões ao longo do tempo
+        self.videoGauss = np.zeros((self.bufferSize, totalPixels, 3))
+        # Quadro empacotado com o nível da pirâmide gaussiana de todas as regiões
+        self.packedLevel = np.zeros((totalPixels, 3))
+        # Buffer circular com a média espacial de cada região (utilizado quando há instantes de captura)
+        self.trace = np.zeros((self.bufferSize, len(self.sizes)))
+        # Inicializando um array para armazenar a média da transformada de Fourier de cada região
+        self.fourierTransformAvg = np.zeros((self.bufferSize, len(self.sizes)))
+
+        # Índices das frequências que pertencem à banda do filtro passa-banda
+        self.bandIndexes = np.flatnonzero(self.mask)
+        # Fatores de rotação (twiddle factors) da DFT para cada frequência da banda e cada posição do buffer
+        self.twiddles = np.exp(-2j * np.pi * np.outer(self.bandIndexes, np.arange(self.bufferSize)) / self.bufferSize)
+        # Espectro das frequências da banda para todos os pixels empacotados
+        self.bandSpectrum = np.zeros((len(self.bandIndexes), totalPixels, 3), dtype = np.complex128)
+
+        # Buffers de BPM e de SNR com uma coluna por região
+        self.bpmBuffer = np.zeros((self.bpmBufferSize, len(self.sizes)))
+        self.snrBuffer = np.zeros((self.bpmBufferSize, len(self.sizes)))
+
+    def fusedBpm(self, bpms):
+        '''
+        Combina os BPMs das regiões ponderando pela SNR média de cada região.
+
+        Inputs:
+            bpms (array) -> BPM médio de cada região.
+
+        Returns:
+            bpm_data (float) -> BPM combinado das regiões.
+        '''
+
+        # Peso de cada região é a SNR média armazenada no buffer
+        weights = self.snrBuffer.mean(axis = 0)
+        # Caso nenhuma região tenha sinal, utiliza a média simples
+        if weights.sum() <= 0: return bpms.mean()
+
+        return np.average(bpms, weights = weights)
+
+    def bandMean(self):
+        '''
+        Obtém a média complexa de cada frequência da banda em cada região.
+
+        Returns:
+            spectrumMean (array) -> Espectro médio com dimensões (frequências da banda, regiões).
+        '''
+
+        return np.add.reduceat(self.bandSpectrum.mean(axis = 2), self.regionOffsets, axis = 1) / self.regionPixels
+
+    def estimateBpm(self, timestamp):
+        '''
+        Calcula e armazena o BPM e a SNR de cada região a partir do espectro da banda ou, quando há
+        instantes de captura, do periodograma de Lomb-Scargle da média espacial de cada região.
+
+        Inputs:
+            timestamp (float) -> Instante de captura (s) do quadro atual ou None.
+        '''
+
+        if timestamp is not None:
+            frequencies, power = self.timestampSpectrum(self.trace)
+            if power is None: return
+        else:
+            # Média complexa de cada frequência da banda em cada região
+            spectrumMean = self.bandMean()
+            # As frequências fora da banda são nulas após o filtro passa-banda
+            self.fourierTransformAvg[:] = 0
+            self.fourierTransformAvg[self.bandIndexes] = np.real(spectrumMean)
+            power = np.abs(spectrumMean) ** 2
+
+        # SNR de cada região: potência do pico da banda sobre a potência das demais frequências da banda
+        peak = power.max(axis = 0)
+        self.snrBuffer[self.bpmBufferIndex] = peak / (power.sum(axis = 0) - peak + 1e-12)
+
+        # Armazena o BPM correspondente à frequência dominante de cada região
+        if timestamp is not None: self.storeBpm(power, frequencies)
+        else: self.storeBpm(self.fourierTransformAvg)
+
+    def update(self, regions, timestamp = None):
+        '''
+        Atualiza o processamento do algoritmo para um novo conjunto de regiões faciais.
+
+        Inputs:
+            regions (list) -> Lista com as subimagens das regiões (retorno de face_utils.extract_local_regions).
+            timestamp (float) -> Instante de captura (s) do quadro. Quando informado, o BPM é estimado pelo
+                                 periodograma de Lomb-Scargle da média espacial de cada região, que tolera
+                                 quadros descartados e taxas de processamento diferentes de 'videoFrameRate'.
+        
+        Returns:
+            outputFrames (list) -> Quadros magnificados de cada região ou None se a magnificação estiver desativada.
+            regions_bpm (array) -> BPM calculado para cada região.
+            bpm_data (float) -> BPM combinado das regiões.
+        '''
+
+        # Padroniza as dimensões das regiões e empacota os níveis da pirâmide gaussiana no mesmo quadro
+        frames = list()
+        for region, (width, height), offset, pixels in zip(regions, self.sizes, self.regionOffsets, self.regionPixels):
+            frame = cv2.resize(region, (width, height))
+            frames.append(frame)
+            level = self.buildGauss(frame, self.levels+1)[self.levels]
+            self.packedLevel[offset : offset + pixels] = level.reshape(-1, 3)
+
+        # Atualiza o espectro de todas as regiões de uma só vez
+        self.updateSpectrum(self.packedLevel)
+        # Armazena a média espacial de cada região e o instante de captura
+        self.trace[self.bufferIndex] = np.add.reduceat(self.packedLevel.mean(axis = 1), self.regionOffsets) / self.regionPixels
+        self.storeTimestamp(timestamp)
+
+        # Verifica se é necessário calcular o BPM neste quadro
+        if self.bufferIndex % self.bpmCalculationFrequency == 0: self.estimateBpm(timestamp)
+
+        outputFrames = None
+        if self.magnify:
+            # Calcula a transformada inversa apenas para a posição atual do buffer
+            twiddles = np.conj(self.twiddles[:, self.bufferIndex])
+            filtered = np.real(np.tensordot(twiddles, self.bandSpectrum, axes = 1)) / self.bufferSize * self.alpha
+
+            outputFrames = list()
+            for frame, (width, height), shape, offset, pixels in zip(frames, self.sizes, self.levelShapes,
+                                                                     self.regionOffsets, self.regionPixels):
+                # Reconstrói o quadro da região a partir do sinal filtrado
+                filteredFrame = filtered[offset : offset + pixels].reshape(shape + (3,))
+                for _ in range(self.levels):
+                    filteredFrame = cv2.pyrUp(filteredFrame)
+                filteredFrame = filteredFrame[:height, :width]
+                # Adiciona o quadro original ao quadro resultante e converte para 8 bits sem sinal (0-255)
+                outputFrames.append(cv2.convertScaleAbs(frame + filteredFrame))
+
+        # Atualiza o índice do buffer circular para o próximo quadro
+        self.bufferIndex = (self.bufferIndex + 1) % self.bufferSize
+
+        # Obtém o BPM de cada região e o BPM combinado
+        regions_bpm = self.currentBpm()
+        bpm_data = None if regions_bpm is None else self.fusedBpm(regions_bpm)
+
+        return outputFrames, regions_bpm, bpm_data
+
+
+class BPMRegionTrace(BPMMultiRegion):
+    '''
+    Reproduz o BPM da BPMMultiRegion a partir apenas da média espacial de cada região no nível da pirâmide
+    gaussiana, sem pixels. Como a transformada de Fourier é linear, o espectro médio de cada região é a
+    transformada da sua média espacial. Utilizado nas varreduras de parâmetros sobre traços armazenados.
+    '''
+
+    def __init__(self, regions = 3, frame_rate = 60, **settings) -> None:
+        '''
+        Construtor da classe
+
+        Inputs:
+            regions (int) -> Quantidade de regiões analisadas.
+            frame_rate (float) -> FPS do vídeo de entrada.
+            settings (dict) -> Parâmetros do algoritmo redefinidos por 'configure'.
+        '''
+
+        # As dimensões das regiões não são utilizadas, apenas a quantidade de regiões
+        super().__init__(sizes = [(1, 1)] * regions, frame_rate = frame_rate)
+        if settings: self.configure(**settings)
+
+    def initBuffers(self):
+        '''
+        Aloca apenas o buffer circular das médias espaciais e os buffers de BPM e de SNR.
+        '''
+
+        self.trace = np.zeros((self.bufferSize, len(self.sizes)))
+        self.fourierTransformAvg = np.zeros((self.bufferSize, len(self.sizes)))
+        self.bandIndexes = np.flatnonzero(self.mask)
+        self.bpmBuffer = np.zeros((self.bpmBufferSize, len(self.sizes)))
+        self.snrBuffer = np.zeros((self.bpmBufferSize, len(self.sizes)))
+
+    def bandMean(self):
+        '''
+        Obtém o espectro da banda a partir da média espacial de cada região.
+        '''
+
+        return np.fft.fft(self.trace, axis = 0)[self.bandIndexes]
+
+    def update(self, means, timestamp = None):
+        '''
+        Atualiza o estimador com a média espacial de cada região no quadro atual.
+
+        Inputs:
+            means (array) -> Média espacial (média dos três canais) de cada região no nível 'levels'.
+            timestamp (float) -> Instante de captura (s) do quadro.
+
+        Returns:
+            regions_bpm (array) -> BPM calculado para cada região.
+            bpm_data (float) -> BPM combinado das regiões.
+        '''
+
+        self.trace[self.bufferIndex] = means
+        self.storeTimestamp(timestamp)
+
+        # Verifica se é necessário calcular o BPM neste quadro
+        if self.bufferIndex % self.bpmCalculationFrequency == 0: self.estimateBpm(timestamp)
+
+        # Atualiza o índice do buffer circular para o próximo quadro
+        self.bufferIndex = (self.bufferIndex + 1) % self.bufferSize
+
+        regions_bpm = self.currentBpm()
+        return regions_bpm, None if regions_bpm is None else self.fusedBpm(regions_bpm)
+
+
+class BPMPool:
+    '''
+    Conjunto limitado de estimadores, um por pessoa. Os estimadores são criados sob demanda e descartados
+    quando ficam sem atualização por mais de 'max_idle' quadros ou quando o limite 'max_estimators' é
+    atingido (o estimador usado há mais tempo é descartado). Assim, a memória e o processamento crescem de
+    forma previsível com a quantidade de faces.
+    '''
+
+    def __init__(self, max_estimators = 4, max_idle = 30, factory = BPMMultiRegion) -> None:
+        '''
+        Construtor da classe
+
+        Inputs:
+            max_estimators (int) -> Quantidade máxima de estimadores mantidos ao mesmo tempo.
+            max_idle (int) -> Quantidade de quadros sem atualização antes de descartar um estimador.
+            factory (callable) -> Função que cria um novo estimador.
+        '''
+
+        self.maxEstimators = max_estimators
+        self.maxIdle = max_idle
+        self.factory = factory
+
+        # Identidade -> [estimador, último quadro em que foi utilizado], em ordem de uso
+        self.estimators = OrderedDict()
+        # Contador de quadros e de estimadores criados e descartados
+        self.frame = 0
+        self.created = 0
+        self.evicted = 0
+
+    def get(self, key):
+        '''
+        Obtém o estimador de uma identidade, criando-o se necessário.
+
+        Inputs:
+            key (hashable) -> Identidade da pessoa.
+
+        Returns:
+            estimator (object) -> Estimador associado à identidade.
+        '''
+
+        if key not in self.estimators:
+            # Descarta o estimador usado há mais tempo se o limite for atingido
+            while len(self.estimators) >= self.maxEstimators:
+                self.estimators.popitem(last = False)
+                self.evicted += 1
+            self.estimators[key] = [self.factory(), self.frame]
+            self.created += 1
+
+        self.estimators.move_to_end(key)
+        self.estimators[key][1] = self.frame
+
+        return self.estimators[key][0]
+
+    def tick(self):
+        '''
+        Avança o contador de quadros e descarta os estimadores ociosos.
+        '''
+
+        self.frame += 1
+        for key in [key for key, (_, last) in self.estimators.items() if self.frame - last > self.maxIdle]:
+            del self.estimators[key]
+            self.evicted += 1
@@ -0,0 +1,113 @@
+import json
+import time
+import os
+import numpy as np
+
+class Checkpoint:
+    '''
+    Cópia periódica do estado de um estimador de BPM em arquivos mapeados em memória, permitindo retomar as
+    leituras logo após reiniciar o processo ou após a face ser perdida por pouco tempo, sem esperar o
+    preenchimento dos buffers. Os buffers são gravados alternadamente em dois conjuntos de arquivos ('a' e
+    'b'); o arquivo de metadados, substituído de forma atômica apenas após a gravação completa, indica o
+    conjunto válido. Assim, uma interrupção durante a gravação nunca corrompe a última cópia.
+    '''
+
+    def __init__(self, path, interval = 5.0, max_age = 30.0):
+        '''
+        Construtor da classe
+
+        Inputs:
+            path (str) -> Diretório dos arquivos da cópia.
+            interval (float) -> Intervalo (s) mínimo entre duas gravações em 'maybe_save'.
+            max_age (float) -> Idade (s) máxima de uma cópia para que ela seja restaurada.
+        '''
+
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+
+        os.makedirs(path, exist_ok = True)
+        # Arquivos mapeados de cada conjunto, reutilizados entre as gravações
+        self.slots = {'a': dict(), 'b': dict()}
+        self.slot = 'a'
+        self.last_save = time.monotonic()
+        self.saves = 0
+
+    def meta_path(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def array_path(self, slot, name):
+        return os.path.join(self.path, f'{slot}_{name}.npy')
+
+    def save(self, estimator):
+        '''
+        Grava o estado do estimador no conjunto de arquivos inativo e o torna válido.
+
+        Inputs:
+            estimator (object) -> Estimador de BPM (BPMFourier ou derivado).
+        '''
+
+        arrays, scalars = estimator.getState()
+        mapped = self.slots[self.slot]
+        for name, array in arrays.items():
+            # Cria (ou recria, se as dimensões mudaram) o arquivo mapeado do buffer
+            if name not in mapped or mapped[name].shape != array.shape or mapped[name].dtype != array.dtype:
+                mapped[name] = np.lib.format.open_memmap(self.array_path(self.slot, name), mode = 'w+',
+                                                          dtype = array.dtype, shape = array.shape)
+            np.copyto(mapped[name], array)
+            mapped[name].flush()
+
+        meta = {'slot': self.slot, 'saved_at': time.time(), 'config': estimator.stateConfig(),
+                'arrays': list(arrays), 'scalars': scalars}
+        temporary = self.meta_path() + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(meta, file)
+        os.replace(temporary, self.meta_path())
+
+        # A próxima gravação utiliza o outro conjunto, preservando a cópia válida
+        self.slot = 'b' if self.slot == 'a' else 'a'
+        self.last_save = time.monotonic()
+        self.saves += 1
+
+    def maybe_save(self, estimator):
+        '''
+        Grava o estado do estimador se o intervalo desde a última gravação foi atingido.
+
+        Returns:
+            saved (bool) -> Verdadeiro se o estado foi gravado.
+        '''
+
+        if time.monotonic() - self.last_save < self.interval: return False
+        self.save(estimator)
+        return True
+
+    def restore(self, estimator):
+        '''
+        Restaura no estimador a última cópia válida, se ela for recente e compatível com a configuração
+        (classe, dimensões das regiões, FPS e parâmetros dos buffers) do estimador.
+
+        Inputs:
+            estimator (object) -> Estimador de BPM recém-criado.
+
+        Returns:
+            restored (bool) -> Verdadeiro se o estado foi restaurado.
+            reason (str) -> Motivo quando a cópia não foi restaurada.
+        '''
+
+        try:
+            with open(self.meta_path()) as file:
+                meta = json.load(file)
+        except FileNotFoundError: return False, 'nenhuma cópia encontrada'
+        except ValueError: return False, 'metadados inválidos'
+
+        age = time.time() - meta['saved_at']
+        if age > self.max_age: return False, f'cópia antiga ({age:.0f} s)'
+
+        try:
+            arrays = {name: np.load(self.array_path(meta['slot'], name), mmap_mode = 'r') for name in meta['arrays']}
+            estimator.setState(meta['config'], arrays, meta['scalars'])
+        except (OSError, ValueError) as error: return False, str(error)
+
+        # A próxima gravação não sobrescreve o conjunto que acabou de ser restaurado
+        self.slot = 'b' if meta['slot'] == 'a' else 'a'
+        return True, None
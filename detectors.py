@@ -0,0 +1,307 @@
+import argparse
+import time
+import numpy as np
+import cv2
+
+import model_loader
+
+class FaceDetector:
+    '''
+    Interface dos detectores de faces. Cada detector pode ser executado sobre o quadro reduzido pelo fator
+    'scale' e, quando a posição da última face é conhecida, apenas em uma janela ao redor dela (a caixa
+    ampliada em 'roi_margin' vezes as suas dimensões em cada direção). As caixas encontradas são convertidas
+    de volta para as coordenadas do quadro original, prontas para o preditor de pontos faciais. Se nenhuma
+    face for encontrada na janela, a busca é repetida no quadro inteiro.
+
+    As subclasses implementam 'detect_faces', que recebe a imagem já recortada e reduzida.
+    '''
+
+    name = 'base'
+
+    def __init__(self, scale = 1.0, roi_margin = None, min_size = (30, 30)):
+        '''
+        Construtor da classe
+
+        Inputs:
+            scale (float) -> Fator de redução do quadro antes da detecção (1.0 mantém a resolução original).
+            roi_margin (float) -> Margem ao redor da última face, em frações das suas dimensões
+                                  (None para sempre buscar no quadro inteiro).
+            min_size (tuple) -> Dimensões mínimas (pixels do quadro original) de uma face.
+        '''
+
+        self.scale = scale
+        self.roi_margin = roi_margin
+        self.min_size = min_size
+
+        # Última face encontrada e contadores de buscas restritas à janela e no quadro inteiro
+        self.last_face = None
+        self.roi_searches = 0
+        self.full_searches = 0
+
+    def detect_faces(self, image, min_size):
+        '''
+        Detecta as faces em uma imagem (implementado por cada detector).
+
+        Inputs:
+            image (array) -> Imagem em escala de cinza, já recortada e reduzida.
+            min_size (tuple) -> Dimensões mínimas de uma face nesta imagem.
+
+        Returns:
+            faces (list) -> Caixas delimitadoras (x, y, w, h) nas coordenadas da imagem recebida.
+        '''
+
+        raise NotImplementedError
+
+    def search(self, gray_image, window):
+        '''
+        Executa o detector em uma janela do quadro e converte as caixas para as coordenadas do quadro.
+        '''
+
+        x0, y0, x1, y1 = window
+        image = gray_image[y0 : y1, x0 : x1]
+        if self.scale != 1.0:
+            image = cv2.resize(image, None, fx = self.scale, fy = self.scale, interpolation = cv2.INTER_AREA)
+
+        min_size = (max(1, int(self.min_size[0] * self.scale)), max(1, int(self.min_size[1] * self.scale)))
+        faces = np.asarray(self.detect_faces(image, min_size), dtype = np.float64).reshape(-1, 4)
+
+        # Converte as caixas da imagem reduzida e recortada para o quadro original
+        faces = faces / self.scale
+        faces[:, :2] += (x0, y0)
+        return np.round(faces).astype(int)
+
+    def roi_window(self, face, shape):
+        '''
+        Obtém a janela de busca ao redor de uma face, limitada às dimensões do quadro.
+        '''
+
+        x, y, w, h = face
+        margin_x, margin_y = self.roi_margin * w, self.roi_margin * h
+        x0, y0 = int(max(0, x - margin_x)), int(max(0, y - margin_y))
+        x1, y1 = int(min(shape[1], x + w + margin_x)), int(min(shape[0], y + h + margin_y))
+        return x0, y0, x1, y1
+
+    def detect(self, gray_image, last_face = None):
+        '''
+        Detecta as faces do quadro, restringindo a busca à janela ao redor da última face quando possível.
+
+        Inputs:
+            gray_image (array) -> Imagem em escala de cinza.
+            last_face (tuple) -> Caixa (x, y, w, h) conhecida da face (padrão: última face detectada).
+
+        Returns:
+            faces (array) -> Caixas delimitadoras (x, y, w, h) nas coordenadas do quadro original.
+        '''
+
+        if last_face is None: last_face = self.last_face
+
+        faces = np.zeros((0, 4), dtype = int)
+        if self.roi_margin is not None and last_face is not None:
+            self.roi_searches += 1
+            faces = self.search(gray_image, self.roi_window(last_face, gray_image.shape))
+
+        # Sem face conhecida ou nenhuma face na janela: busca no quadro inteiro
+        if len(faces) == 0:
+            self.full_searches += 1
+            faces = self.search(gray_image, (0, 0, gray_image.shape[1], gray_image.shape[0]))
+
+        # A maior face é utilizada como referência para a próxima busca
+        self.last_face = tuple(max(faces, key = lambda face: face[2] * face[3])) if len(faces) else None
+        return faces
+
+    def __call__(self, gray_image, last_face = None):
+        return self.detect(gray_image, last_face)
+
+class CascadeDetector(FaceDetector):
+    '''
+    Detector em cascata do OpenCV (LBP ou Haar), com os mesmos parâmetros de 'face_utils.facial_detection'.
+    '''
+
+    name = 'cascade'
+
+    def __init__(self, face_cascade, scale_factor = 1.3, min_neighbors = 5, **options):
+        '''
+        Inputs:
+            face_cascade (CascadeClassifier ou str) -> Detector carregado ou caminho dos seus pesos.
+            scale_factor (float) -> Fator entre duas escalas da busca.
+            min_neighbors (int) -> Quantidade mínima de detecções vizinhas para aceitar uma face.
+        '''
+
+        super().__init__(**options)
+        if isinstance(face_cascade, str):
+            path, face_cascade = face_cascade, cv2.CascadeClassifier(face_cascade)
+            if face_cascade.empty(): raise IOError(f'Erro para carregar o detector de faces: {path}')
+
+        self.face_cascade = face_cascade
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect_faces(self, image, min_size):
+        return self.face_cascade.detectMultiScale(image = image, scaleFactor = self.scale_factor,
+                                                  minNeighbors = self.min_neighbors, minSize = min_size)
+
+class HOGDetector(FaceDetector):
+    '''
+    Detector frontal HOG + SVM linear do dlib.
+    '''
+
+    name = 'hog'
+
+    def __init__(self, upsample = 0, **options):
+        '''
+        Inputs:
+            upsample (int) -> Quantidade de ampliações da imagem antes da busca (permite faces menores).
+        '''
+
+        import dlib
+
+        super().__init__(**options)
+        self.detector = dlib.get_frontal_face_detector()
+        self.upsample = upsample
+
+    def detect_faces(self, image, min_size):
+        # O dlib exige uma imagem contígua na memória (o recorte da janela é apenas uma visão do quadro)
+        rects = self.detector(np.ascontiguousarray(image), self.upsample)
+        faces = [(rect.left(), rect.top(), rect.width(), rect.height()) for rect in rects]
+        return [face for face in faces if face[2] >= min_size[0] and face[3] >= min_size[1]]
+
+class DNNDetector(FaceDetector):
+    '''
+    Detector de faces SSD (ResNet-10) do módulo DNN do OpenCV, a partir de um arquivo local do modelo
+    (por exemplo, 'res10_300x300_ssd_iter_140000.caffemodel' e 'deploy.prototxt').
+    '''
+
+    name = 'dnn'
+
+    def __init__(self, model_path, config_path = '', confidence = 0.5, input_size = (300, 300), **options):
+        '''
+        Inputs:
+            model_path (str) -> Caminho dos pesos do modelo.
+            config_path (str) -> Caminho da descrição da rede (prototxt), quando necessário.
+            confidence (float) -> Confiança mínima de uma detecção.
+            input_size (tuple) -> Dimensões da entrada da rede.
+        '''
+
+        super().__init__(**options)
+        self.net = cv2.dnn.readNet(model_path, config_path)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect_faces(self, image, min_size):
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), 1.0, self.input_size,
+                                     (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward().reshape(-1, 7)
+
+        # Cada detecção possui a confiança e a caixa normalizada (x1, y1, x2, y2)
+        detections = detections[detections[:, 2] >= self.confidence]
+        boxes = np.clip(detections[:, 3:7], 0, 1) * (width, height, width, height)
+        faces = np.column_stack((boxes[:, :2], boxes[:, 2:] - boxes[:, :2]))
+        return faces[(faces[:, 2] >= min_size[0]) & (faces[:, 3] >= min_size[1])]
+
+def create_detector(backend, **options):
+    '''
+    Cria um detector de faces pelo nome do backend.
+
+    Inputs:
+        backend (str) -> 'cascade', 'hog' ou 'dnn'.
+        options (dict) -> Parâmetros do detector (incluindo 'scale' e 'roi_margin').
+
+    Returns:
+        detector (FaceDetector) -> Detector criado.
+    '''
+
+    backends = {detector.name: detector for detector in (CascadeDetector, HOGDetector, DNNDetector)}
+    if backend not in backends:
+        raise ValueError(f'Detector desconhecido: {backend}')
+
+    return backends[backend](**options)
+
+def synthetic_sequence(frames = 120, width = 640, height = 480, seed = 0):
+    '''
+    Gera uma sequência de quadros com uma face desenhada em movimento lento, para avaliar a busca restrita
+    à janela ao redor da última face.
+
+    Returns:
+        sequence (list) -> Pares (quadro em escala de cinza, caixa verdadeira da face).
+    '''
+
+    import benchmark
+
+    sequence = list()
+    for index in range(frames):
+        t = index / frames
+        center = (int(width / 2 + width / 5 * np.sin(2 * np.pi * t)), int(height / 2 + height / 8 * np.cos(2 * np.pi * t)))
+        frame, face = benchmark.synthetic_frame(width, height, seed = seed, center = center, size = 170)
+        sequence.append((cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), face))
+
+    return sequence
+
+def compare(detectors, sequence, min_iou = 0.3):
+    '''
+    Compara a latência e a revocação de cada detector na mesma sequência de quadros.
+
+    Inputs:
+        detectors (list) -> Pares (descrição, detector).
+        sequence (list) -> Pares (quadro em escala de cinza, caixa verdadeira ou None).
+        min_iou (float) -> Sobreposição mínima para considerar a face encontrada.
+    '''
+
+    import face_utils
+
+    print(f'{"detector":>28} | {"p50 ms":>8} | {"p90 ms":>8} | {"revocação":>9} | {"buscas na janela":>16}')
+    for description, detector in detectors:
+        latencies, found = list(), list()
+        for gray, truth in sequence:
+            start = time.perf_counter()
+            faces = detector.detect(gray)
+            latencies.append(time.perf_counter() - start)
+            if truth is not None:
+                found.append(any(face_utils.FaceIdentifier.iou(face, truth) >= min_iou for face in faces))
+
+        p50, p90 = np.percentile(latencies, [50, 90]) * 1000
+        recall = f'{np.mean(found):.2f}' if found else '-'
+        searches = detector.roi_searches + detector.full_searches
+        print(f'{description:>28} | {p50:8.2f} | {p90:8.2f} | {recall:>9} | '
+              f'{detector.roi_searches:>7} de {searches:<6}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Compara a latência e a revocação dos detectores de faces.')
+    parser.add_argument('--video', default = None, help = 'vídeo avaliado (padrão: sequência sintética; sem revocação)')
+    parser.add_argument('--frames', type = int, default = 120, help = 'quantidade de quadros avaliados')
+    parser.add_argument('--scale', type = float, default = 0.5, help = 'fator de redução avaliado')
+    parser.add_argument('--roi-margin', type = float, default = 0.5, help = 'margem da janela ao redor da última face')
+    parser.add_argument('--cascade', default = model_loader.CASCADE_PATH)
+    parser.add_argument('--dnn-model', default = 'models/res10_300x300_ssd_iter_140000.caffemodel')
+    parser.add_argument('--dnn-config', default = 'models/deploy.prototxt')
+    args = parser.parse_args()
+
+    if args.video is None:
+        sequence = synthetic_sequence(args.frames)
+    else:
+        # Em vídeos reais não há caixa verdadeira: apenas a latência é informada
+        cap = cv2.VideoCapture(args.video)
+        sequence = list()
+        while len(sequence) < args.frames:
+            ret, frame = cap.read()
+            if not ret: break
+            sequence.append((cv2.cvtColor(cv2.resize(frame, (640, 480)), cv2.COLOR_BGR2GRAY), None))
+        cap.release()
+
+    backends = {'cascade': {'face_cascade': args.cascade}, 'hog': {},
+                'dnn': {'model_path': args.dnn_model, 'config_path': args.dnn_config}}
+    # Cada backend é avaliado no quadro inteiro, no quadro reduzido e no quadro reduzido com janela
+    variants = [('', {}), (f' x{args.scale}', {'scale': args.scale}),
+                (f' x{args.scale} janela', {'scale': args.scale, 'roi_margin': args.roi_margin})]
+
+    detectors = list()
+    for backend, options in backends.items():
+        for suffix, variant in variants:
+            try:
+                detectors.append((backend + suffix, create_detector(backend, **options, **variant)))
+            except (ImportError, IOError, cv2.error) as error:
+                print(f'{backend + suffix:>28} | indisponível: {str(error).strip().splitlines()[-1]}')
+                break
+
+    compare(detectors, sequence)
@@ -1,5 +1,5 @@
+import contextlib
 import numpy as np
-import dlib
 import cv2 
 
 def facial_detection(gray_image, face_cascade):
@@ -33,6 +33,9 @@ def face_landmarks(gray_image, faces, predictor):
         facial_points_np (array) -> Pontos faciais obtidos.
     '''
     
+    # O dlib só é importado quando os pontos faciais são preditos
+    import dlib
+
     # Converte as coordenadas para o padrão do dlib
     (x, y, w, h) = faces[0]
     face_dlib = dlib.rectangle(x, y, x + w, y + h)
@@ -43,6 +46,44 @@ def face_landmarks(gray_image, faces, predictor):
 
     return facial_points_np
 
+def face_landmarks_all(gray_image, faces, predictor):
+    '''
+    Realiza a predição dos pontos faciais de todas as faces detectadas em uma única chamada.
+
+    Inputs:
+        gray_image (array) -> Imagem para realização da inferência.
+        faces (list) -> Coordenadas das caixas delimitadoras.
+        predictor (shape_predictor) -> Arquitetura de predição de pontos faciais.
+    
+    Return:
+        facial_points_np (array) -> Pontos faciais de cada face, com dimensões (faces, 68, 2).
+    '''
+
+    # O dlib só é importado quando os pontos faciais são preditos
+    import dlib
+
+    # Converte todas as coordenadas para o padrão do dlib e realiza a predição sobre a mesma imagem
+    shapes = [predictor(gray_image, dlib.rectangle(int(x), int(y), int(x + w), int(y + h))) for (x, y, w, h) in faces]
+    # Sem faces, retorna um array vazio com as dimensões esperadas
+    if len(shapes) == 0: return np.zeros((0, 68, 2), dtype = int)
+    # Converte os pontos faciais de todas as faces para um único array numpy
+    facial_points_np = np.array([[(p.x, p.y) for p in shape.parts()] for shape in shapes], dtype = int)
+
+    return facial_points_np
+
+def get_reference_points(facial_points):
+    '''
+    Obtém os pontos de referência da testa e das bochechas diretamente do array de pontos faciais.
+
+    Inputs:
+        facial_points (array) -> Pontos faciais obtidos.
+    
+    Returns:
+        point_ref (list) -> Lista com os pontos de referência para a bochecha e da testa
+    '''
+
+    return [tuple(facial_points[index]) for index in (19, 24, 41, 46)]
+
 def get_facial_analisis_coords(points_ref):
     '''
     Obtém as caixas delimitadoras das bochechas e da testa através de pontos chave.
@@ -124,6 +165,26 @@ def draw_rectangle_face(image, faces):
     # Se mais de uma face for detectada, retorna flag 2
     else: return 2
 
+def draw_rectangle_faces(image, faces, face_ids, bpms):
+    '''
+    Desenha uma caixa delimitadora com a identidade e o BPM de cada face detectada.
+
+    Inputs:
+        image (array) -> Imagem para realização da inferência.
+        faces (list) -> Coordenadas das caixas delimitadoras.
+        face_ids (list) -> Identidade de cada face.
+        bpms (list) -> BPM de cada face (None enquanto estiver calculando).
+    '''
+
+    for (x, y, w, h), face_id, bpm_data in zip(faces, face_ids, bpms):
+        cv2.rectangle(img = image, pt1 = (x - 10, y - 50), pt2 = (x + w + 10, y + h + 30), 
+                      color = (0, 0, 0), thickness = 2)
+        # Informa a identidade e o BPM da face acima da caixa delimitadora
+        bpm_text = 'Calculando' if bpm_data is None else f'{np.round(bpm_data, 2)}'
+        cv2.putText(img = image, text = f'#{face_id} BPM: {bpm_text}', org = (x - 10, y - 55), 
+                    fontFace = cv2.FONT_HERSHEY_SIMPLEX, fontScale = 0.5, color = [0, 0, 255],
+                    thickness = 1)
+
 def draw_landmarks(image, facial_points):
     '''
     Desenha na imagem os pontos faciais detectados.
@@ -136,17 +197,16 @@ def draw_landmarks(image, facial_points):
         point_ref (list) -> Lista com os pontos de referência para a bochecha e da testa
     '''
     
-    # Obtém os pontos de referência para análise do batimento cardíaco
-    point_ref = list()
-    # Desenhar um círculo em cada ponto facial
-    for index, (x, y) in enumerate(facial_points):
-        cv2.circle(img = image, center = (x, y), radius = 1, color = (0, 0, 255),
-                thickness = cv2.FILLED)  
-        # Obtém os pontos de referência para extrair fragmentos de imagem da bochecha e da testa
-        if index == 19 or index == 24 or index == 41 or index == 46: 
-            point_ref.append((x, y))
-    
-    return point_ref
+    # Desenha todos os pontos de uma vez, sem uma chamada do OpenCV por ponto, com o mesmo formato
+    # de cruz do círculo preenchido de raio 1
+    points = np.asarray(facial_points, dtype = int)
+    offsets = np.array([[0, 0], [-1, 0], [1, 0], [0, -1], [0, 1]])
+    pixels = (points[:, None, :] + offsets[None, :, :]).reshape(-1, 2)
+    inside = (pixels[:, 0] >= 0) & (pixels[:, 0] < image.shape[1]) & (pixels[:, 1] >= 0) & (pixels[:, 1] < image.shape[0])
+    image[pixels[inside, 1], pixels[inside, 0]] = (0, 0, 255)
+
+    # Os pontos de referência são lidos diretamente do array de pontos faciais
+    return get_reference_points(points)
 
 def draw_rectangle_facial_locals(image, coords_facial_locals):
     '''
@@ -176,4 +236,239 @@ def draw_rectangle_facial_locals(image, coords_facial_locals):
         return 1
     
     # Caso haja alguma incoerência com os pontos das caixas delimitadoras, retorna falso
-    else: return 0
\ No newline at end of file
+    else: return 0
+
+
+class FaceTracker:
+    '''
+    Rastreia uma única face entre quadros para evitar executar o detector facial e o preditor de pontos
+    faciais em todos os quadros. O detector só é executado a cada 'detection_interval' quadros ou quando a
+    confiança do rastreamento cai abaixo de 'min_confidence'. Entre as detecções, os pontos faciais são
+    propagados por fluxo óptico esparso (Lucas-Kanade) e a caixa delimitadora é deslocada pelo movimento
+    mediano dos pontos.
+    '''
+
+    def __init__(self, face_cascade, predictor, detection_interval = 10, min_confidence = 0.8, detector = None,
+                 runtime_metrics = None):
+        '''
+        Construtor da classe
+
+        Inputs:
+            face_cascade (CascadeClassifier) -> Arquitetura pré-treinada de detecção facial.
+            predictor (shape_predictor) -> Arquitetura de predição de pontos faciais.
+            detection_interval (int) -> Quantidade máxima de quadros entre duas detecções.
+            min_confidence (float) -> Fração mínima de pontos rastreados com sucesso para manter o rastreamento.
+            detector (FaceDetector) -> Detector de faces do módulo 'detectors' (substitui 'face_cascade').
+            runtime_metrics (Metrics) -> Métricas onde são registrados os estágios 'detection', 'tracking' e
+                                         'landmarks' (opcional).
+        '''
+
+        self.face_cascade = face_cascade
+        self.detector = detector
+        self.predictor = predictor
+        self.detection_interval = detection_interval
+        self.min_confidence = min_confidence
+        self.runtime_metrics = runtime_metrics
+
+        # Parâmetros do fluxo óptico de Lucas-Kanade
+        self.lk_params = dict(winSize = (15, 15), maxLevel = 2,
+                              criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+        # Estado do rastreamento (quadro anterior, caixa delimitadora e pontos faciais)
+        self.previous_gray = None
+        self.face = None
+        self.points = None
+        self.frames_since_detection = 0
+        self.confidence = 0.0
+
+        # Contadores de chamadas do detector e de quadros resolvidos apenas com o rastreamento
+        self.detector_calls = 0
+        self.tracked_frames = 0
+
+    def stage(self, name):
+        '''
+        Cronometra um estágio do rastreador nas métricas, quando configuradas.
+        '''
+
+        if self.runtime_metrics is None: return contextlib.nullcontext()
+        return self.runtime_metrics.stage(name)
+
+    def reset(self):
+        '''
+        Descarta a face rastreada, forçando uma nova detecção no próximo quadro.
+        '''
+
+        self.previous_gray = None
+        self.face = None
+        self.points = None
+        self.confidence = 0.0
+
+    def detect(self, gray_image):
+        '''
+        Executa o detector facial e o preditor de pontos faciais e reinicia o rastreamento.
+
+        Inputs:
+            gray_image (array) -> Imagem para realização da inferência.
+
+        Returns:
+            faces (list) -> Coordenadas das caixas delimitadoras detectadas.
+            facial_points (array) -> Pontos faciais obtidos ou None se não houver exatamente uma face.
+        '''
+
+        self.detector_calls += 1
+        self.frames_since_detection = 0
+
+        with self.stage('detection'):
+            if self.detector is not None:
+                # A busca é restrita à janela ao redor da última posição rastreada da face, quando configurada
+                last_face = None if self.face is None else tuple(self.face)
+                faces = self.detector.detect(gray_image, last_face = last_face)
+            else:
+                faces = facial_detection(gray_image = gray_image, face_cascade = self.face_cascade)
+        # O rastreamento só é mantido quando existe exatamente uma face
+        if len(faces) != 1:
+            self.reset()
+            return faces, None
+
+        with self.stage('landmarks'):
+            facial_points = face_landmarks(gray_image = gray_image, faces = faces, predictor = self.predictor)
+
+        self.previous_gray = gray_image
+        self.face = np.array(faces[0], dtype = np.float32)
+        self.points = facial_points.astype(np.float32).reshape(-1, 1, 2)
+        self.confidence = 1.0
+
+        return faces, facial_points
+
+    def track(self, gray_image):
+        '''
+        Propaga a caixa delimitadora e os pontos faciais do quadro anterior por fluxo óptico.
+
+        Inputs:
+            gray_image (array) -> Imagem para realização da inferência.
+
+        Returns:
+            tracked (bool) -> Informa se a confiança do rastreamento foi suficiente.
+        '''
+
+        # Fluxo óptico para frente e para trás para validar cada ponto rastreado
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self.previous_gray, gray_image, self.points, None, **self.lk_params)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray_image, self.previous_gray, points, None, **self.lk_params)
+        error = np.linalg.norm((self.points - back_points).reshape(-1, 2), axis = 1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < 1.0)
+
+        self.confidence = good.mean()
+        if self.confidence < self.min_confidence: return False
+
+        # Desloca a caixa delimitadora e os pontos perdidos pelo movimento mediano dos pontos válidos
+        displacement = np.median((points - self.points).reshape(-1, 2)[good], axis = 0)
+        points[~good] = self.points[~good] + displacement
+        self.face[:2] += displacement
+
+        self.previous_gray = gray_image
+        self.points = points
+        return True
+
+    def update(self, gray_image):
+        '''
+        Obtém a face e os pontos faciais do quadro atual, detectando ou rastreando conforme necessário.
+
+        Inputs:
+            gray_image (array) -> Imagem para realização da inferência.
+
+        Returns:
+            faces (list) -> Coordenadas das caixas delimitadoras.
+            facial_points (array) -> Pontos faciais obtidos ou None se não houver exatamente uma face.
+        '''
+
+        self.frames_since_detection += 1
+
+        # Rastreia a face enquanto o intervalo de detecção não for atingido e a confiança for suficiente
+        if self.face is not None and self.frames_since_detection < self.detection_interval:
+            with self.stage('tracking'):
+                tracked = self.track(gray_image)
+            if tracked:
+                self.tracked_frames += 1
+                faces = np.round(self.face).astype(int).reshape(1, 4)
+                facial_points = np.round(self.points.reshape(-1, 2)).astype(int)
+                return faces, facial_points
+
+        return self.detect(gray_image)
+
+
+class FaceIdentifier:
+    '''
+    Atribui uma identidade estável a cada face entre quadros, associando as caixas delimitadoras do quadro
+    atual às do quadro anterior pela maior sobreposição (IoU). Faces que não forem vistas por mais de
+    'max_missing' quadros são descartadas.
+    '''
+
+    def __init__(self, min_iou = 0.3, max_missing = 15):
+        '''
+        Construtor da classe
+
+        Inputs:
+            min_iou (float) -> Sobreposição mínima para considerar que duas caixas são da mesma face.
+            max_missing (int) -> Quantidade de quadros que uma face pode ficar sem ser vista.
+        '''
+
+        self.min_iou = min_iou
+        self.max_missing = max_missing
+
+        # Identidade -> [caixa delimitadora, quadros sem ser vista]
+        self.tracks = dict()
+        self.next_id = 0
+
+    @staticmethod
+    def iou(box1, box2):
+        '''
+        Calcula a sobreposição (interseção sobre união) entre duas caixas delimitadoras (x, y, w, h).
+        '''
+
+        x1, y1 = max(box1[0], box2[0]), max(box1[1], box2[1])
+        x2 = min(box1[0] + box1[2], box2[0] + box2[2])
+        y2 = min(box1[1] + box1[3], box2[1] + box2[3])
+        intersection = max(0, x2 - x1) * max(0, y2 - y1)
+        union = box1[2] * box1[3] + box2[2] * box2[3] - intersection
+
+        return intersection / union if union > 0 else 0.0
+
+    def update(self, faces):
+        '''
+        Associa as faces do quadro atual às identidades conhecidas.
+
+        Inputs:
+            faces (list) -> Coordenadas das caixas delimitadoras do quadro atual.
+
+        Returns:
+            face_ids (list) -> Identidade de cada face, na mesma ordem de 'faces'.
+        '''
+
+        # Pares (face, identidade) ordenados pela maior sobreposição
+        pairs = sorted(((self.iou(face, track[0]), index, face_id)
+                        for index, face in enumerate(faces) for face_id, track in self.tracks.items()), reverse = True)
+
+        face_ids = [None] * len(faces)
+        matched = set()
+        for overlap, index, face_id in pairs:
+            if overlap < self.min_iou: break
+            if face_ids[index] is not None or face_id in matched: continue
+            face_ids[index] = face_id
+            matched.add(face_id)
+
+        # Faces sem correspondência recebem uma nova identidade
+        for index in range(len(faces)):
+            if face_ids[index] is None:
+                face_ids[index] = self.next_id
+                self.next_id += 1
+
+        # Incrementa o contador das identidades não vistas e descarta as que excederam o limite
+        for face_id in list(self.tracks):
+            if face_id not in matched:
+                self.tracks[face_id][1] += 1
+                if self.tracks[face_id][1] > self.max_missing: del self.tracks[face_id]
+
+        for face, face_id in zip(faces, face_ids):
+            self.tracks[face_id] = [tuple(face), 0]
+
+        return face_ids
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+
+import benchmark
+import server
+
+async def run_stream(clip, fps, duration, mode, host, port, unix_path):
+    '''
+    Simula uma câmera: envia quadros (ou recortes) no ritmo do FPS e mede a latência de cada leitura.
+
+    Inputs:
+        clip (list) -> Quadros completos ou listas de recortes enviados em ciclo.
+        fps (float) -> Ritmo de envio.
+        duration (float) -> Duração do envio em segundos.
+        mode (str) -> Modo da sessão ('rois' ou 'frame').
+        host (str) -> Endereço TCP do servidor.
+        port (int) -> Porta TCP do servidor.
+        unix_path (str) -> Caminho do socket Unix (substitui o endereço TCP).
+
+    Returns:
+        stats (dict) -> Mensagens enviadas, leituras recebidas, erros, descartes e latências (s).
+    '''
+
+    client = await server.BPMClient.connect(host, port, unix_path)
+    opened = await client.open(mode = mode, frame_rate = fps)
+    if opened['type'] != 'opened':
+        raise RuntimeError(opened.get('message'))
+
+    sent_at, latencies = dict(), list()
+    stats = {'sent': 0, 'received': 0, 'errors': 0, 'dropped': 0}
+
+    async def receive():
+        async for header in client.readings():
+            if header['type'] == 'error': stats['errors'] += 1
+            if header['type'] not in ('bpm', 'error'): continue
+            stats['received'] += 1
+            stats['dropped'] = header.get('dropped', stats['dropped'])
+            latencies.append(time.perf_counter() - sent_at.pop(header['index']))
+            # Todas as mensagens foram respondidas ou descartadas
+            if stats['received'] + stats['dropped'] >= stats['sent'] and sending.done(): return
+
+    async def send():
+        start = time.perf_counter()
+        index = 0
+        while time.perf_counter() - start < duration:
+            # Mantém o ritmo da câmera independentemente do tempo de resposta do servidor
+            await asyncio.sleep(max(0.0, start + index / fps - time.perf_counter()))
+            sent_at[index] = time.perf_counter()
+            timestamp = index / fps
+            if mode == 'frame': await client.send_frame(clip[index % len(clip)], timestamp)
+            else: await client.send_rois(clip[index % len(clip)], timestamp)
+            index += 1
+            stats['sent'] = index
+
+    sending = asyncio.create_task(send())
+    receiving = asyncio.create_task(receive())
+    await sending
+    # Aguarda as respostas pendentes por um tempo limitado
+    try: await asyncio.wait_for(receiving, timeout = 5.0)
+    except asyncio.TimeoutError: pass
+    await client.close()
+
+    stats['latencies'] = latencies
+    return stats
+
+async def run_load(streams, clip, fps, duration, mode, host, port, unix_path):
+    '''
+    Executa várias câmeras simuladas ao mesmo tempo e resume a vazão e a latência.
+    '''
+
+    results = await asyncio.gather(*[run_stream(clip, fps, duration, mode, host, port, unix_path)
+                                     for _ in range(streams)])
+
+    latencies = np.array([latency for stats in results for latency in stats['latencies']])
+    sent = sum(stats['sent'] for stats in results)
+    received = sum(stats['received'] for stats in results)
+    dropped = sum(stats['dropped'] for stats in results)
+    errors = sum(stats['errors'] for stats in results)
+    p50, p90 = np.percentile(latencies, [50, 90]) * 1000 if len(latencies) else (np.nan, np.nan)
+
+    # A carga é sustentada se quase todas as mensagens são respondidas em menos de um segundo
+    sustained = received >= 0.95 * sent and p90 < 1000
+    print(f'{streams:>8} | {sent / duration:12.1f} | {received / duration:12.1f} | {dropped:9d} | {errors:6d} | '
+          f'{p50:8.1f} | {p90:8.1f} | {"sim" if sustained else "não":>11}')
+    return sustained
+
+async def check_regions(clip, fps, host, port, unix_path):
+    '''
+    Verifica o protocolo: uma mensagem com menos regiões do que a sessão espera deve receber um erro,
+    sem encerrar a sessão, e a mensagem seguinte com as três regiões deve receber uma leitura de BPM.
+
+    Inputs:
+        clip (list) -> Listas de recortes (testa e bochechas).
+        fps (float) -> FPS da sessão.
+        host (str) -> Endereço TCP do servidor.
+        port (int) -> Porta TCP do servidor.
+        unix_path (str) -> Caminho do socket Unix (substitui o endereço TCP).
+
+    Returns:
+        passed (bool) -> Verdadeiro se as duas respostas foram as esperadas.
+    '''
+
+    client = await server.BPMClient.connect(host, port, unix_path)
+    opened = await client.open(mode = 'rois', frame_rate = fps)
+    if opened['type'] != 'opened':
+        raise RuntimeError(opened.get('message'))
+
+    await client.send_rois(clip[0][:2], timestamp = 0.0)
+    await client.send_rois(clip[1], timestamp = 1 / fps)
+    replies = list()
+    async for header in client.readings():
+        if header['type'] in ('bpm', 'error'): replies.append(header)
+        if len(replies) == 2: break
+    await client.close()
+
+    passed = [header['type'] for header in replies] == ['error', 'bpm']
+    print(f'Regiões faltando: {replies[0].get("message") if replies else "sem resposta"} | '
+          f'{"ok" if passed else "falhou"}')
+    return passed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Gerador de carga: mede quantas câmeras simultâneas o servidor sustenta.')
+    parser.add_argument('--streams', default = '1,2,4,8,16', help = 'quantidades de câmeras simultâneas avaliadas')
+    parser.add_argument('--fps', type = float, default = 30, help = 'FPS de cada câmera simulada')
+    parser.add_argument('--duration', type = float, default = 10, help = 'duração de cada etapa em segundos')
+    parser.add_argument('--mode', choices = ('rois', 'frame'), default = 'rois', help = 'envia recortes ou quadros JPEG')
+    parser.add_argument('--host', default = '127.0.0.1', help = 'endereço TCP do servidor')
+    parser.add_argument('--port', type = int, default = 8765, help = 'porta TCP do servidor')
+    parser.add_argument('--unix', default = None, help = 'caminho do socket Unix (substitui o TCP)')
+    parser.add_argument('--check', action = 'store_true', help = 'apenas verifica a validação das regiões e encerra')
+    args = parser.parse_args()
+
+    if args.mode == 'frame':
+        clip = [benchmark.synthetic_frame(seed = 0)[0]]
+    else:
+        sizes = [(100, 40), (40, 25), (40, 25)]
+        clips = [benchmark.synthetic_clip(width, height, 300, frame_rate = args.fps, seed = seed)
+                 for seed, (width, height) in enumerate(sizes)]
+        clip = list(zip(*clips))
+
+    if args.check:
+        exit(0 if asyncio.run(check_regions(clip, args.fps, args.host, args.port, args.unix)) else 1)
+
+    print(f'{"câmeras":>8} | {"enviadas/s":>12} | {"respostas/s":>12} | {"descartes":>9} | {"erros":>6} | '
+          f'{"p50 ms":>8} | {"p90 ms":>8} | {"sustentado":>11}')
+    for streams in [int(value) for value in args.streams.split(',')]:
+        if not asyncio.run(run_load(streams, clip, args.fps, args.duration, args.mode, args.host, args.port, args.unix)):
+            break
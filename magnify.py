@@ -0,0 +1,344 @@
+import concurrent.futures
+import multiprocessing
+import threading
+import argparse
+import queue
+import time
+import os
+import numpy as np
+import cv2
+
+from multiprocessing import shared_memory
+
+import bpm
+
+def stripe_bounds(height, stripes, overlap, align):
+    '''
+    Divide a altura do quadro em faixas horizontais com sobreposição. Os limites de cada faixa são múltiplos de
+    'align' (2 ** levels), de forma que os níveis da pirâmide gaussiana de cada faixa coincidem com os do quadro
+    inteiro; a sobreposição absorve o efeito da borda de cada faixa nos filtros da pirâmide.
+
+    Inputs:
+        height (int) -> Altura do quadro.
+        stripes (int) -> Quantidade de faixas.
+        overlap (int) -> Linhas de sobreposição acima e abaixo de cada faixa (arredondadas para múltiplo de 'align').
+        align (int) -> Alinhamento dos limites das faixas.
+
+    Returns:
+        bounds (list) -> Tuplas (início, fim) da parte útil e (início, fim) da faixa processada de cada faixa.
+    '''
+
+    overlap = int(np.ceil(overlap / align)) * align
+    # Limites da parte útil de cada faixa, alinhados e sem faixas vazias
+    cuts = sorted(set([0] + [int(round(height * index / stripes / align)) * align for index in range(1, stripes)]
+                      + [height]))
+    cuts = [cut for cut in cuts if cut <= height]
+
+    bounds = list()
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        bounds.append(((start, end), (max(0, start - overlap), min(height, end + overlap))))
+    return bounds
+
+def create_stripes(width, bounds, frame_rate, settings):
+    '''
+    Cria um estimador com DFT deslizante pré-alocada para cada faixa processada.
+    '''
+
+    estimators = list()
+    for _, (start, end) in bounds:
+        estimator = bpm.BPMPreallocated(width, end - start, frame_rate = frame_rate)
+        if settings: estimator.configure(**settings)
+        estimators.append(estimator)
+    return estimators
+
+def magnify_stripe(estimator, frame, output, bounds):
+    '''
+    Magnifica uma faixa do quadro e copia a parte útil para o quadro de saída.
+    '''
+
+    (start, end), (padded_start, padded_end) = bounds
+    magnified, _ = estimator.update(frame[padded_start : padded_end])
+    output[start : end] = magnified[start - padded_start : end - padded_start]
+
+def stripe_worker(connection, input_name, output_name, shape, width, bounds, frame_rate, settings):
+    '''
+    Processo que mantém os estimadores de um conjunto de faixas e as magnifica a cada comando 'update',
+    lendo o quadro de entrada e escrevendo o quadro de saída nos blocos de memória compartilhada.
+    '''
+
+    input_memory = shared_memory.SharedMemory(name = input_name)
+    output_memory = shared_memory.SharedMemory(name = output_name)
+    frame = np.ndarray(shape, dtype = np.uint8, buffer = input_memory.buf)
+    output = np.ndarray(shape, dtype = np.uint8, buffer = output_memory.buf)
+    estimators = create_stripes(width, bounds, frame_rate, settings)
+
+    try:
+        while connection.recv() == 'update':
+            for estimator, stripe in zip(estimators, bounds):
+                magnify_stripe(estimator, frame, output, stripe)
+            connection.send(True)
+    except EOFError: pass
+    finally:
+        del frame, output
+        input_memory.close()
+        output_memory.close()
+
+class TiledMagnifier:
+    '''
+    Magnificação euleriana do quadro inteiro, dividido em faixas horizontais sobrepostas. Cada faixa possui
+    o seu próprio estimador com DFT deslizante pré-alocada (BPMPreallocated), e as faixas são processadas em
+    paralelo por um conjunto de threads (as operações do OpenCV e do numpy liberam o GIL) ou de processos.
+    No modo de processos, cada processo mantém os estimadores das suas faixas e o quadro de entrada e o de
+    saída são trocados por blocos de memória compartilhada, sem cópias entre os processos.
+    '''
+
+    def __init__(self, width = 640, height = 480, frame_rate = 30, stripes = None, overlap = 32, workers = None,
+                 backend = 'thread', **settings):
+        '''
+        Construtor da classe
+
+        Inputs:
+            width (int) -> Largura do quadro.
+            height (int) -> Altura do quadro.
+            frame_rate (float) -> FPS do vídeo.
+            stripes (int) -> Quantidade de faixas (padrão: uma por processo ou thread).
+            overlap (int) -> Linhas de sobreposição acima e abaixo de cada faixa.
+            workers (int) -> Quantidade de threads ou processos (padrão: quantidade de núcleos).
+            backend (str) -> 'thread' ou 'process'.
+            settings (dict) -> Parâmetros do estimador ('levels', 'alpha', 'minFrequency', ...).
+        '''
+
+        if backend not in ('thread', 'process'):
+            raise ValueError(f'Modo de processamento desconhecido: {backend}')
+
+        self.width = width
+        self.height = height
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        levels = settings.get('levels', 3)
+        self.bounds = stripe_bounds(height, stripes or self.workers, overlap, 2 ** levels)
+        self.frames = 0
+
+        shape = (height, width, 3)
+        if backend == 'thread':
+            self.estimators = create_stripes(width, self.bounds, frame_rate, settings)
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = self.workers)
+            self.frame = np.zeros(shape, dtype = np.uint8)
+            self.output = np.zeros(shape, dtype = np.uint8)
+            return
+
+        # Blocos de memória compartilhada com o quadro de entrada e o de saída
+        size = int(np.prod(shape))
+        self.memories = [shared_memory.SharedMemory(create = True, size = size) for _ in range(2)]
+        self.frame = np.ndarray(shape, dtype = np.uint8, buffer = self.memories[0].buf)
+        self.output = np.ndarray(shape, dtype = np.uint8, buffer = self.memories[1].buf)
+
+        # Os processos não são criados por 'fork', que copiaria as threads e os sockets do processo principal
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(method)
+
+        # Distribui as faixas entre os processos, que mantêm os seus estimadores entre os quadros
+        self.connections, self.processes = list(), list()
+        for worker in range(min(self.workers, len(self.bounds))):
+            connection, child = context.Pipe()
+            process = context.Process(target = stripe_worker, daemon = True,
+                                      args = (child, self.memories[0].name, self.memories[1].name, shape, width,
+                                              self.bounds[worker :: self.workers], frame_rate, settings))
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def update(self, frame):
+        '''
+        Magnifica um novo quadro.
+
+        Inputs:
+            frame (array) -> Quadro (uint8) com as dimensões do construtor.
+
+        Returns:
+            outputFrame (array) -> Quadro magnificado (buffer reutilizado entre as chamadas).
+
+        Raises:
+            RuntimeError -> Se um processo de magnificação foi encerrado.
+        '''
+
+        np.copyto(self.frame, frame)
+        if self.backend == 'thread':
+            futures = [self.executor.submit(magnify_stripe, estimator, self.frame, self.output, stripe)
+                       for estimator, stripe in zip(self.estimators, self.bounds)]
+            for future in futures: future.result()
+        else:
+            try:
+                for connection in self.connections: connection.send('update')
+                for connection in self.connections: connection.recv()
+            except (EOFError, OSError) as error:
+                codes = [process.exitcode for process in self.processes if not process.is_alive()]
+                raise RuntimeError(f'Processo de magnificação encerrado (códigos de saída: {codes})') from error
+
+        self.frames += 1
+        return self.output
+
+    def close(self):
+        '''
+        Encerra as threads ou os processos e libera a memória compartilhada.
+        '''
+
+        if self.backend == 'thread':
+            self.executor.shutdown()
+            return
+
+        for connection in self.connections:
+            try: connection.send('close')
+            except (BrokenPipeError, OSError): pass
+        for process in self.processes: process.join(timeout = 5.0)
+        del self.frame, self.output
+        for memory in self.memories:
+            memory.close()
+            memory.unlink()
+
+class MagnificationRecorder:
+    '''
+    Gravação do vídeo magnificado em segundo plano. O laço principal apenas entrega uma cópia do quadro com
+    'submit', sem esperar; uma thread magnifica os quadros da fila e os escreve no arquivo. Se a gravação não
+    acompanhar a câmera, os quadros que não cabem na fila são descartados e contados em 'dropped', mantendo
+    o laço do BPM no seu ritmo (os quadros descartados não entram no filtro temporal da magnificação).
+    Uma falha na magnificação encerra a gravação: o erro fica em 'error', os quadros seguintes são descartados
+    e 'close' o relança após liberar o vídeo e os processos.
+    '''
+
+    def __init__(self, path, width = 640, height = 480, frame_rate = 30, queue_size = 30, fourcc = 'MJPG',
+                 **options):
+        '''
+        Construtor da classe
+
+        Inputs:
+            path (str) -> Arquivo de vídeo de saída.
+            width (int) -> Largura do quadro.
+            height (int) -> Altura do quadro.
+            frame_rate (float) -> FPS do vídeo.
+            queue_size (int) -> Quantidade máxima de quadros aguardando a gravação.
+            fourcc (str) -> Codec do vídeo de saída.
+            options (dict) -> Parâmetros do TiledMagnifier ('stripes', 'workers', 'backend', ...).
+        '''
+
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), frame_rate, (width, height))
+        if not self.writer.isOpened(): raise IOError(f'Erro para criar o vídeo de saída: {path}')
+
+        self.magnifier = TiledMagnifier(width, height, frame_rate, **options)
+        self.queue = queue.Queue(maxsize = queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def submit(self, frame):
+        '''
+        Entrega um quadro para a gravação sem bloquear o chamador.
+
+        Returns:
+            accepted (bool) -> Falso se a fila estava cheia ou a gravação falhou e o quadro foi descartado.
+        '''
+
+        if self.error is not None:
+            self.dropped += 1
+            return False
+
+        try: self.queue.put_nowait(frame.copy())
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def run(self):
+        '''
+        Magnifica e grava os quadros da fila até receber o fim da gravação ou ocorrer uma falha.
+        '''
+
+        try:
+            while (frame := self.queue.get()) is not None:
+                self.writer.write(self.magnifier.update(frame))
+                self.written += 1
+        except Exception as error:
+            self.error = error
+            print(f'Erro na gravação do vídeo magnificado: {error}')
+
+    def close(self):
+        '''
+        Grava os quadros pendentes e fecha o vídeo de saída.
+
+        Raises:
+            RuntimeError -> Se a gravação foi interrompida por uma falha na magnificação.
+        '''
+
+        # Só espera espaço na fila enquanto a thread de gravação ainda a consome
+        while self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout = 0.1)
+                break
+            except queue.Full: pass
+        self.thread.join()
+        self.writer.release()
+        self.magnifier.close()
+
+        if self.error is not None: raise RuntimeError('Gravação do vídeo magnificado interrompida') from self.error
+
+def measure(update, clip):
+    '''
+    Mede a latência (ms) por quadro de uma função de magnificação.
+    '''
+
+    latencies = list()
+    for frame in clip:
+        start = time.perf_counter()
+        update(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, [50, 90])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Magnificação euleriana do quadro inteiro em faixas paralelas.')
+    parser.add_argument('--video', default = None, help = 'vídeo de entrada (padrão: sequência sintética)')
+    parser.add_argument('--output', default = None, help = 'grava o vídeo magnificado neste arquivo')
+    parser.add_argument('--frames', type = int, default = 150, help = 'quadros da sequência sintética')
+    parser.add_argument('--fps', type = float, default = 30, help = 'FPS do vídeo')
+    parser.add_argument('--stripes', type = int, default = None, help = 'quantidade de faixas')
+    parser.add_argument('--overlap', type = int, default = 32, help = 'linhas de sobreposição entre as faixas')
+    parser.add_argument('--workers', type = int, default = None, help = 'quantidade de threads ou processos')
+    args = parser.parse_args()
+
+    if args.video is None:
+        # A sequência sintética só é necessária na linha de comando (main.py não importa o benchmark)
+        import benchmark
+        clip = benchmark.synthetic_clip(640, 480, args.frames, frame_rate = args.fps)
+    else:
+        capture, clip = cv2.VideoCapture(args.video), list()
+        while len(clip) < args.frames and (frame := capture.read()[1]) is not None:
+            clip.append(cv2.resize(frame, (640, 480)))
+        capture.release()
+    height, width = clip[0].shape[:2]
+
+    if args.output is not None:
+        # Gravação em segundo plano: o envio dos quadros não espera a magnificação
+        recorder = MagnificationRecorder(args.output, width, height, args.fps, stripes = args.stripes,
+                                         overlap = args.overlap, workers = args.workers)
+        p50, p90 = measure(recorder.submit, clip)
+        recorder.close()
+        print(f'{recorder.written} quadros gravados em {args.output} ({recorder.dropped} descartados) | '
+              f'envio p50 {p50:.3f} ms | p90 {p90:.3f} ms')
+        exit()
+
+    print(f'{"modo":>28} | {"p50 ms":>8} | {"p90 ms":>8}')
+    full = bpm.BPMPreallocated(width, height, frame_rate = args.fps)
+    p50, p90 = measure(full.update, clip)
+    print(f'{"quadro inteiro":>28} | {p50:8.2f} | {p90:8.2f}')
+
+    for backend in ('thread', 'process'):
+        magnifier = TiledMagnifier(width, height, args.fps, stripes = args.stripes, overlap = args.overlap,
+                                   workers = args.workers, backend = backend)
+        p50, p90 = measure(magnifier.update, clip)
+        # Diferença máxima para o quadro inteiro no último quadro (efeito residual das bordas das faixas)
+        error = np.abs(magnifier.output.astype(int) - full.outputFrame.astype(int)).max()
+        print(f'{f"{len(magnifier.bounds)} faixas ({backend})":>28} | {p50:8.2f} | {p90:8.2f} | '
+              f'diferença máxima {error}')
+        magnifier.close()
@@ -1,109 +1,271 @@
-
 import face_utils
 import numpy as np
+import checkpoint
+import detectors
+import magnify
+import model_loader
 import utils
-import dlib 
 import cv2
+import metrics
+import os
+import signal
+import time
 import bpm
 
-# Inicializando a classe que realiza as medições de batimento cardíaco e definindo as dimensões das imagens
-forehead_bpm = bpm.BPMFourier(width = 100, height = 40)
-checks1_bpm = bpm.BPMFourier(width = 40, height = 25)
-checks2_bpm = bpm.BPMFourier(width = 40, height = 25)
-
-# Dispositivo de captura de entrada (0 -> dispositivo padrão de webcam)
-cap = cv2.VideoCapture(0)
-
-# Verificar se a câmera abriu corretamente
-if not cap.isOpened():
-    print('Erro para inicializar a entrada de vídeo.')
-    exit()
-
-# Pesos treinados do detector de faces (Local Binary Patterns Improved)
-facial_detection_path = 'lib64/python3.10/site-packages/cv2/data/lbpcascade_frontalface_improved.xml'
-# Carregando a arquitetura de detecção facial
-face_cascade = cv2.CascadeClassifier(facial_detection_path)
-# Pesos treinados do modelo de detecção de pontos faciais (Face Landmarks - 68 points)
-predictor_landmarks = dlib.shape_predictor('lib64/python3.10/site-packages/dlib/shape_predictor_68_face_landmarks.dat')
-
-# Intera sobre os frames da WebCam
-while cap.isOpened():
-
-    # Captura o frame atual da WebCam
-    ret, frame = cap.read()
-    # Normaliza as dimensões do display de vídeo
-    frame = cv2.resize(src = frame, dsize = (640, 480))
-    # Espelha a imagem horizontalmente para correção de visualização
-    frame = cv2.flip(src = frame, flipCode = 1)
-    # Cria uma cópia da imagem de referência pré-processada
-    frame_copy = frame.copy()
-    # Modifica a imagem para a escala de cinza em apenas 1 canal
-    gray = cv2.cvtColor(src = frame, code = cv2.COLOR_BGR2GRAY)
-
-    # Caso não consiga interar sobre o frame, finaliza a interação
-    if not ret: 
-        print('Erro na entrada de vídeo.')
-        break
-    
-    # Realiza a detecção facial no frame atual com um modelo pré-treinado
-    faces = face_utils.facial_detection(gray_image = gray, face_cascade = face_cascade)
-    # Desenha as caixas delimitadoras sobre as faces detectadas
-    info_detection = face_utils.draw_rectangle_face(image = frame, faces = faces)
-    
-    
-    if len(faces) == 1:
-        # Obtém os pontos facias a partir da caixa delimitadoras
-        facial_points = face_utils.face_landmarks(gray_image = gray, faces = faces, 
-                                                  predictor = predictor_landmarks)
-        # Desenha na imagem os pontos facias e obtém os pontos de análise da bochecha e da testa
-        points_ref = face_utils.draw_landmarks(image = frame, facial_points = facial_points)
-        # Obtém as coordenadas das caixas delimitadoras das bochechas e da testa para análise
-        coords_facial_locals = face_utils.get_facial_analisis_coords(points_ref)
-        # Desenha na imagem as coordenadas das bochechas e da testa
-        landmarks_flag = face_utils.draw_rectangle_facial_locals(image = frame, 
-                                                                 coords_facial_locals = coords_facial_locals)
-        
-        if landmarks_flag:
-            # Extrai as imagens das bochechas e da testa para análise do batimento cardiaco
-            image_locals = face_utils.extract_local_regions(image = frame_copy, coords_facial_locals = coords_facial_locals)
-            
-            try:
-                # Padroniza a dimensão dos pedaços de imagens da testa e da bochecha
-                forehead = cv2.resize(image_locals[0], (100, 40))
-                checks1 = cv2.resize(image_locals[1], (40, 25))
-                checks2 = cv2.resize(image_locals[1], (40, 25)) 
-
-                # Manda para a classe que calcula o BPM para iniciar o procedimento de interação e obter os dados
-                forehead_image, forehead_data = forehead_bpm.update(frame = forehead)
-                checks1_image, checks1_data = checks1_bpm.update(frame = checks1)
-                checks2_image, checks2_data =checks2_bpm.update(frame = checks2)
-
-                # Se ainda estiver no processo de interação, informa que ainda está calculando na tela
-                if forehead_data == None or checks1_data == None or checks2_data == None:
-                    cv2.putText(img = frame, text = 'Batimento por Minuto: Calculando', org = (5, 460), 
+def main():
+    '''
+    Captura os quadros da WebCam, estima o batimento cardíaco das regiões faciais e exibe o resultado.
+    '''
+
+    # Caminhos dos modelos (padrão: variáveis de ambiente PDS_CASCADE_PATH e PDS_PREDICTOR_PATH). Os modelos são
+    # carregados em segundo plano enquanto a câmera é aberta, e os primeiros quadros são exibidos durante o carregamento
+    cascade_path = model_loader.CASCADE_PATH
+    predictor_path = model_loader.PREDICTOR_PATH
+    models_loading = model_loader.preload(cascade_path, predictor_path)
+
+    # Inicializando a classe que realiza as medições de batimento cardíaco e definindo as dimensões das regiões
+    # (testa, bochecha esquerda e bochecha direita)
+    regions_bpm = bpm.BPMMultiRegion(sizes = [(100, 40), (40, 25), (40, 25)])
+
+    # Cópia do estado do estimador gravada a cada 5 segundos. Ao reiniciar o programa em até 30 segundos, o estado
+    # é restaurado (se a geometria e o FPS forem os mesmos) e as leituras retomam sem esperar o aquecimento. O
+    # diretório é definido pela variável de ambiente PDS_CHECKPOINT_PATH (vazia desativa a cópia). Apenas o modo
+    # de uma face é copiado: no modo de múltiplas faces, as identidades não se mantêm entre execuções
+    checkpoint_path = os.environ.get('PDS_CHECKPOINT_PATH', 'checkpoint')
+    estimator_checkpoint = None
+    if checkpoint_path:
+        estimator_checkpoint = checkpoint.Checkpoint(checkpoint_path, interval = 5.0, max_age = 30.0)
+        restored, reason = estimator_checkpoint.restore(regions_bpm)
+        print('Estado do estimador restaurado.' if restored else f'Estado do estimador não restaurado: {reason}')
+
+    # Quantidade máxima de pessoas monitoradas ao mesmo tempo (acima de 1 ativa o modo de múltiplas faces)
+    max_faces = 1
+    # Conjunto de estimadores (um por pessoa) e associação de identidades entre quadros no modo de múltiplas faces
+    bpm_pool = bpm.BPMPool(max_estimators = max_faces, max_idle = 30)
+    face_identifier = face_utils.FaceIdentifier(min_iou = 0.3, max_missing = 15)
+
+    # Instrumentação do pipeline: tempo de cada estágio, quadros descartados ou com falha e FPS recente.
+    # Quando ativada, o resumo é escrito a cada 5 segundos no arquivo (.json ou .prom para o Prometheus)
+    runtime_metrics = metrics.Metrics(enabled = False, path = 'metrics.json', interval = 5.0)
+
+    # Renderização desacoplada da análise: com 'headless' ativado nenhuma janela é aberta e nada é desenhado,
+    # exceto quando um quadro é solicitado (sinal SIGUSR1), que é salvo em 'snapshot.png'. Com 'render_every'
+    # igual a N apenas um a cada N quadros é desenhado (0 desenha apenas sob demanda)
+    headless = False
+    render_every = 1
+    renderer = utils.Renderer(every = render_every, headless = headless)
+
+    # Gravação do vídeo magnificado do quadro inteiro (None desativa). A magnificação é feita em faixas paralelas
+    # ('record_backend' igual a 'thread' ou 'process') por uma thread em segundo plano, sem atrasar o laço do BPM
+    record_path = None
+    record_backend = 'thread'
+    recorder = None if record_path is None else magnify.MagnificationRecorder(record_path, 640, 480, frame_rate = 30,
+                                                                              backend = record_backend)
+
+    # Interrompe o laço de forma limpa com Ctrl+C, necessário no modo sem display (sem leitura do teclado)
+    stop_requested = False
+    def request_stop(signum, frame):
+        nonlocal stop_requested
+        stop_requested = True
+    signal.signal(signal.SIGINT, request_stop)
+
+    # Dispositivo de captura de entrada (0 -> dispositivo padrão de webcam)
+    cap = cv2.VideoCapture(0)
+
+    # Verificar se a câmera abriu corretamente
+    if not cap.isOpened():
+        print('Erro para inicializar a entrada de vídeo.')
+        return
+
+    # Detector de faces: 'cascade' (LBP, padrão), 'hog' (dlib) ou 'dnn' (modelo SSD local do OpenCV). Com
+    # 'detection_scale' menor que 1 a detecção ocorre no quadro reduzido, e 'roi_margin' restringe a busca à
+    # vizinhança da última face (None busca sempre no quadro inteiro; não se aplica ao modo de múltiplas faces)
+    detector_backend = 'cascade'
+    detection_scale = 1.0
+    roi_margin = None
+    # O detector e o rastreador facial são criados quando o carregamento dos modelos termina
+    face_detector, face_tracker = None, None
+    # Chamadas do detector no modo de múltiplas faces, em que o rastreador não é utilizado
+    multi_face_calls = 0
+
+    # Intera sobre os frames da WebCam
+    while cap.isOpened() and not stop_requested:
+
+        # Captura o frame atual da WebCam e registra o instante de captura
+        with runtime_metrics.stage('capture'):
+            ret, frame = cap.read()
+        timestamp = time.monotonic()
+
+        # Caso não consiga interar sobre o frame, finaliza a interação
+        if not ret: 
+            print('Erro na entrada de vídeo.')
+            break
+
+        with runtime_metrics.stage('preprocess'):
+            # Normaliza as dimensões do display de vídeo
+            frame = cv2.resize(src = frame, dsize = (640, 480))
+            # Espelha a imagem horizontalmente para correção de visualização
+            frame = cv2.flip(src = frame, flipCode = 1)
+            # Modifica a imagem para a escala de cinza em apenas 1 canal
+            gray = cv2.cvtColor(src = frame, code = cv2.COLOR_BGR2GRAY)
+
+        # Entrega uma cópia do quadro, antes de qualquer desenho, para a gravação do vídeo magnificado
+        if recorder is not None: recorder.submit(frame)
+
+        # Enquanto os modelos são carregados, apenas exibe o quadro da câmera
+        if face_tracker is None:
+            if not models_loading.done():
+                if renderer.due():
+                    cv2.putText(img = frame, text = 'Carregando modelos...', org = (5, 460),
                                 fontFace = cv2.FONT_HERSHEY_SIMPLEX, fontScale = 1, color = [0, 0, 255],
                                 thickness = 2)
-                # Caso contrário, calcula a média do BPM para as três regiões faciais e mostra na tela
-                elif forehead_data != None and checks1_data != None and checks2_data != None:
-                    bpm_mean = (forehead_data + checks1_data + checks2_data) / 3
-                    bpm_mean = np.round(bpm_mean, 2)
-                    cv2.putText(img = frame, text = f'Batimento por Minuto: {bpm_mean}', org = (5, 460), 
+                    renderer.show(frame)
+                if renderer.poll_key() == ord('q'): break
+                continue
+
+            try: face_cascade, predictor_landmarks = models_loading.result()
+            except (ImportError, IOError, RuntimeError) as error:
+                print(f'Erro para carregar os modelos: {error}')
+                break
+
+            detector_options = {'cascade': {'face_cascade': face_cascade}, 'hog': {},
+                                'dnn': {'model_path': 'models/res10_300x300_ssd_iter_140000.caffemodel',
+                                        'config_path': 'models/deploy.prototxt'}}[detector_backend]
+            face_detector = detectors.create_detector(detector_backend, scale = detection_scale,
+                                                      roi_margin = roi_margin if max_faces == 1 else None,
+                                                      **detector_options)
+
+            # Rastreador facial: executa o detector a cada 10 quadros ou quando a confiança do rastreamento cai
+            # (os estágios 'detection', 'tracking' e 'landmarks' são registrados separadamente nas métricas)
+            face_tracker = face_utils.FaceTracker(face_cascade = face_cascade, predictor = predictor_landmarks,
+                                                  detection_interval = 10, detector = face_detector,
+                                                  runtime_metrics = runtime_metrics)
+        
+        # Modo de múltiplas faces: cada pessoa possui sua própria identidade e seu próprio estimador
+        if max_faces > 1:
+            # Realiza a detecção facial e mantém apenas as maiores faces até o limite configurado
+            with runtime_metrics.stage('detection'):
+                faces = face_detector.detect(gray)
+            multi_face_calls += 1
+            faces = sorted(faces, key = lambda face: face[2] * face[3], reverse = True)[:max_faces]
+            # Associa as faces às identidades do quadro anterior e obtém os pontos faciais de todas as faces
+            face_ids = face_identifier.update(faces)
+            with runtime_metrics.stage('landmarks'):
+                all_facial_points = face_utils.face_landmarks_all(gray_image = gray, faces = faces, 
+                                                                  predictor = predictor_landmarks)
+            if len(faces) == 0: runtime_metrics.count('no_face')
+
+            bpms, all_coords = list(), list()
+            for face_id, facial_points in zip(face_ids, all_facial_points):
+                # Obtém as regiões da testa e das bochechas diretamente dos pontos faciais
+                points_ref = face_utils.get_reference_points(facial_points)
+                coords_facial_locals = face_utils.get_facial_analisis_coords(points_ref)
+                all_coords.append(coords_facial_locals)
+                image_locals = face_utils.extract_local_regions(image = frame, coords_facial_locals = coords_facial_locals)
+
+                try:
+                    # Atualiza o estimador da pessoa com as regiões do quadro atual
+                    with runtime_metrics.stage('bpm'):
+                        _, _, bpm_data = bpm_pool.get(face_id).update(regions = image_locals, timestamp = timestamp)
+                except cv2.error:
+                    runtime_metrics.count('bpm_failed')
+                    bpm_data = None
+                bpms.append(bpm_data)
+
+            # Descarta os estimadores das pessoas que deixaram a cena
+            bpm_pool.tick()
+            facial_points = None
+        else:
+            # Obtém a face e os pontos faciais, detectando com os modelos pré-treinados ou rastreando do quadro anterior
+            faces, facial_points = face_tracker.update(gray_image = gray)
+            if facial_points is None: runtime_metrics.count('no_face')
+        
+        # Análise: as regiões são obtidas diretamente do array de pontos faciais, sem desenhar no quadro
+        coords_facial_locals, bpm_status = None, None
+        if facial_points is not None:
+            # Obtém os pontos de referência e as caixas delimitadoras das bochechas e da testa para análise
+            points_ref = face_utils.get_reference_points(facial_points)
+            coords_facial_locals = face_utils.get_facial_analisis_coords(points_ref)
+            
+            if len(coords_facial_locals) == 3:
+                # Extrai as imagens das bochechas e da testa para análise do batimento cardiaco
+                image_locals = face_utils.extract_local_regions(image = frame, coords_facial_locals = coords_facial_locals)
+                
+                try:
+                    # Manda as regiões da testa e das bochechas para a classe que calcula o BPM e obtém os dados
+                    with runtime_metrics.stage('bpm'):
+                        _, regions_data, bpm_data = regions_bpm.update(regions = image_locals, timestamp = timestamp)
+
+                    # Enquanto estiver no processo de interação, informa que ainda está calculando;
+                    # caso contrário, informa o BPM combinado das três regiões faciais
+                    bpm_status = 'Calculando' if bpm_data is None else f'{np.round(bpm_data, 2)}'
+                    # Grava a cópia do estado do estimador quando o intervalo for atingido
+                    if estimator_checkpoint is not None: estimator_checkpoint.maybe_save(regions_bpm)
+                # Regiões vazias ou fora da imagem não podem ser redimensionadas e o quadro é descartado
+                except Exception: runtime_metrics.count('bpm_failed')
+            else: runtime_metrics.count('invalid_regions')
+
+        # Renderização: desenha e exibe o quadro apenas quando devido (ou solicitado)
+        with runtime_metrics.stage('render'):
+            if renderer.due():
+                if max_faces > 1:
+                    # Desenha as regiões e as caixas delimitadoras com a identidade e o BPM de cada pessoa
+                    for coords in all_coords:
+                        face_utils.draw_rectangle_facial_locals(image = frame, coords_facial_locals = coords)
+                    face_utils.draw_rectangle_faces(image = frame, faces = faces, face_ids = face_ids, bpms = bpms)
+                    info_detection = min(len(faces), 2)
+                else:
+                    # Desenha as caixas delimitadoras sobre as faces detectadas
+                    info_detection = face_utils.draw_rectangle_face(image = frame, faces = faces)
+
+                if facial_points is not None:
+                    # Desenha na imagem os pontos faciais e as regiões das bochechas e da testa
+                    face_utils.draw_landmarks(image = frame, facial_points = facial_points)
+                    face_utils.draw_rectangle_facial_locals(image = frame, coords_facial_locals = coords_facial_locals)
+
+                if bpm_status is not None:
+                    cv2.putText(img = frame, text = f'Batimento por Minuto: {bpm_status}', org = (5, 460), 
                                 fontFace = cv2.FONT_HERSHEY_SIMPLEX, fontScale = 1, color = [0, 0, 255],
                                 thickness = 2)
-            except: pass
 
-    # Aplica informações textuais sobre o frame
-    utils.text_image(image = frame, detection_flag = info_detection)
+                # Aplica informações textuais sobre o frame
+                utils.text_image(image = frame, detection_flag = info_detection)
+
+                # Mostra a imagem de saída em um display externo (ou salva o quadro no modo sem display)
+                renderer.show(frame)
+            
+            # Captura a entrada de tecla do usuário e adiciona um delay na interação dos frames
+            key = renderer.poll_key()
+
+        # Registra o fim do quadro e as chamadas do detector facial do modo em execução
+        detector_calls = face_tracker.detector_calls if max_faces == 1 else multi_face_calls
+        runtime_metrics.gauge('detector_calls', detector_calls)
+        runtime_metrics.tick()
+
+        # Caso o usuário pressione a tecla q, feche o programa
+        if key == ord('q'): break
+
+    # Informa quantas chamadas do detector facial foram economizadas pelo rastreamento
+    if face_tracker is not None:
+        print(f'Chamadas do detector: {face_tracker.detector_calls if max_faces == 1 else multi_face_calls} | '
+              f'Chamadas economizadas pelo rastreamento: {face_tracker.tracked_frames} | '
+              f'Quadros renderizados: {renderer.rendered} de {renderer.frame_count}')
+
+    # Grava o estado final do estimador para a próxima execução
+    if estimator_checkpoint is not None and regions_bpm.i > 0: estimator_checkpoint.save(regions_bpm)
+
+    # Escreve o último resumo das métricas
+    if runtime_metrics.enabled and runtime_metrics.path is not None: runtime_metrics.export()
 
-    # Mostra a imagem de saída em um display externo
-    cv2.imshow(winname = 'Batimento Cardiaco - PDS Projeto', mat = frame)
-    
-    # Captura a entrada de tecla do usuário e adiciona um delay na interação dos frames
-    key= cv2.waitKey(delay = 1)
+    # Grava os quadros pendentes do vídeo magnificado
+    if recorder is not None:
+        try: recorder.close()
+        except RuntimeError as error: print(f'{error}: {error.__cause__}')
+        print(f'Vídeo magnificado: {recorder.written} quadros gravados, {recorder.dropped} descartados')
 
-    # Caso o usuário pressione a tecla q, feche o programa
-    if key == ord('q'): break
+    # Fecha o display corretamente gerado pelo OpenCV
+    cap.release()
+    renderer.close()
 
-# Fecha o display corretamente gerado pelo OpenCV
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import tracemalloc
+import numpy as np
+
+import bpm
+
+def buffer_bytes(estimator):
+    '''
+    Soma a memória ocupada pelos arrays mantidos pelo estimador.
+
+    Inputs:
+        estimator (object) -> Estimador de BPM.
+
+    Returns:
+        nbytes (int) -> Quantidade de bytes dos arrays do estimador.
+    '''
+
+    arrays = list()
+    for value in vars(estimator).values():
+        if isinstance(value, np.ndarray): arrays.append(value)
+        elif isinstance(value, list): arrays.extend(item for item in value if isinstance(item, np.ndarray))
+
+    return sum(array.nbytes for array in arrays)
+
+def update_allocations(estimator, frames):
+    '''
+    Mede a memória alocada temporariamente por cada chamada de 'update'.
+
+    Inputs:
+        estimator (object) -> Estimador de BPM.
+        frames (list) -> Quadros utilizados nas chamadas.
+
+    Returns:
+        peak (float) -> Média do pico de memória temporária (bytes) por chamada.
+        retained (int) -> Memória (bytes) que permaneceu alocada após todas as chamadas.
+    '''
+
+    # Aquece o estimador para que alocações únicas não entrem na medição
+    for frame in frames[:10]: estimator.update(frame)
+
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    peaks = list()
+    for frame in frames:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        estimator.update(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return float(np.mean(peaks)), end - start
+
+def report(sizes = ((100, 40), (40, 25), (40, 25)), frames = 300):
+    '''
+    Imprime a memória dos buffers e as alocações por quadro da BPMFourier (antes) e da BPMPreallocated
+    (depois) para cada dimensão de região.
+
+    Inputs:
+        sizes (list) -> Dimensões (largura, altura) das regiões.
+        frames (int) -> Quantidade de quadros utilizados em cada medição.
+    '''
+
+    rng = np.random.default_rng(0)
+    print(f'{"região":>8} | {"estimador":>16} | {"buffers (KiB)":>13} | {"pico/quadro (KiB)":>17} | {"retido (KiB)":>12}')
+    for (width, height) in sizes:
+        clip = [rng.integers(0, 256, (height, width, 3), dtype = np.uint8) for _ in range(frames)]
+        for factory in (bpm.BPMFourier, bpm.BPMPreallocated):
+            estimator = factory(width, height)
+            peak, retained = update_allocations(estimator, clip)
+            print(f'{f"{width}x{height}":>8} | {factory.__name__:>16} | {buffer_bytes(estimator) / 1024:13.1f} | '
+                  f'{peak / 1024:17.1f} | {retained / 1024:12.1f}')
+
+if __name__ == '__main__':
+    report()
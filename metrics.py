@@ -0,0 +1,185 @@
+import contextlib
+import collections
+import threading
+import json
+import time
+import os
+
+class StageTimer:
+    '''
+    Cronômetro de um estágio do pipeline, utilizado como gerenciador de contexto.
+    '''
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    '''
+    Instrumentação do pipeline: tempo de cada estágio, contadores de quadros descartados ou com falha,
+    valores instantâneos (gauges) e FPS médio recente. Um resumo é escrito periodicamente em um arquivo
+    JSON ou no formato texto do Prometheus (extensão '.prom'). Quando desativada, 'stage' retorna um
+    contexto vazio compartilhado e 'count', 'gauge' e 'tick' retornam imediatamente.
+    '''
+
+    # Contexto vazio reutilizado quando a instrumentação está desativada
+    disabled_stage = contextlib.nullcontext()
+
+    def __init__(self, enabled = True, path = None, interval = 5.0, window = 256):
+        '''
+        Construtor da classe
+
+        Inputs:
+            enabled (bool) -> Ativa a coleta das métricas.
+            path (str) -> Arquivo onde o resumo é escrito (None para não escrever).
+            interval (float) -> Intervalo (s) entre duas escritas do resumo.
+            window (int) -> Quantidade de medições recentes usadas nos percentis e no FPS.
+        '''
+
+        self.enabled = enabled
+        self.path = path
+        self.interval = interval
+        self.window = window
+
+        self.lock = threading.Lock()
+        # Nome do estágio -> [quantidade, tempo total, tempo máximo, medições recentes]
+        self.stages = dict()
+        self.counters = collections.Counter()
+        self.gauges = dict()
+        # Instantes dos quadros recentes, para o cálculo do FPS
+        self.frames = collections.deque(maxlen = window)
+        self.last_export = time.monotonic()
+
+    def stage(self, name):
+        '''
+        Cronometra um estágio: 'with metrics.stage("bpm"): ...'.
+
+        Inputs:
+            name (str) -> Nome do estágio.
+        '''
+
+        if not self.enabled: return self.disabled_stage
+        return StageTimer(self, name)
+
+    def record(self, name, seconds):
+        '''
+        Registra a duração de uma execução de um estágio.
+
+        Inputs:
+            name (str) -> Nome do estágio.
+            seconds (float) -> Duração em segundos.
+        '''
+
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0, 0.0, 0.0, collections.deque(maxlen = self.window)]
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+            stage[3].append(seconds)
+
+    def count(self, name, value = 1):
+        '''
+        Incrementa um contador (por exemplo, quadros sem face ou com falha na estimação).
+        '''
+
+        if not self.enabled: return
+        with self.lock:
+            self.counters[name] += value
+
+    def gauge(self, name, value):
+        '''
+        Registra um valor instantâneo (por exemplo, a profundidade de uma fila).
+        '''
+
+        if not self.enabled: return
+        with self.lock:
+            self.gauges[name] = value
+
+    def tick(self):
+        '''
+        Registra o fim do processamento de um quadro e escreve o resumo se o intervalo foi atingido.
+        '''
+
+        if not self.enabled: return
+        now = time.monotonic()
+        with self.lock:
+            self.frames.append(now)
+            self.counters['frames'] += 1
+
+        if self.path is not None and now - self.last_export >= self.interval:
+            self.last_export = now
+            self.export()
+
+    def fps(self):
+        '''
+        Obtém o FPS médio dos quadros recentes.
+        '''
+
+        with self.lock:
+            if len(self.frames) < 2: return 0.0
+            return (len(self.frames) - 1) / (self.frames[-1] - self.frames[0])
+
+    def snapshot(self):
+        '''
+        Obtém um resumo das métricas coletadas.
+
+        Returns:
+            snapshot (dict) -> FPS, contadores, valores instantâneos e estatísticas (ms) de cada estágio.
+        '''
+
+        fps = self.fps()
+        with self.lock:
+            stages = dict()
+            for name, (count, total, maximum, recent) in self.stages.items():
+                ordered = sorted(recent)
+                stages[name] = {'count': count, 'mean_ms': 1000 * total / count, 'max_ms': 1000 * maximum,
+                                'p50_ms': 1000 * ordered[len(ordered) // 2],
+                                'p90_ms': 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]}
+
+            return {'timestamp': time.time(), 'fps': fps, 'counters': dict(self.counters),
+                    'gauges': dict(self.gauges), 'stages': stages}
+
+    def prometheus(self, snapshot):
+        '''
+        Converte o resumo para o formato texto do Prometheus.
+        '''
+
+        lines = [f'bpm_fps {snapshot["fps"]:.3f}']
+        for name, value in snapshot['counters'].items():
+            lines.append(f'bpm_{name}_total {value}')
+        for name, value in snapshot['gauges'].items():
+            lines.append(f'bpm_{name} {value}')
+        for name, stats in snapshot['stages'].items():
+            for key, value in stats.items():
+                lines.append(f'bpm_stage_{key}{{stage="{name}"}} {value:.6f}' if key != 'count'
+                             else f'bpm_stage_count{{stage="{name}"}} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        '''
+        Escreve o resumo no arquivo configurado, substituindo o anterior de forma atômica.
+        '''
+
+        snapshot = self.snapshot()
+        if self.path.endswith('.prom'):
+            content = self.prometheus(snapshot)
+        else:
+            content = json.dumps(snapshot, indent = 2)
+
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as file:
+            file.write(content)
+        os.replace(temporary, self.path)
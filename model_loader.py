@@ -0,0 +1,111 @@
+import concurrent.futures
+import threading
+import os
+import cv2
+
+# Caminhos padrão dos modelos, configuráveis pelas variáveis de ambiente PDS_CASCADE_PATH e PDS_PREDICTOR_PATH
+# ou por 'configure' (por exemplo, no inicializador de um pool de processos)
+CASCADE_PATH = os.environ.get('PDS_CASCADE_PATH',
+                              'lib64/python3.10/site-packages/cv2/data/lbpcascade_frontalface_improved.xml')
+PREDICTOR_PATH = os.environ.get('PDS_PREDICTOR_PATH',
+                                'lib64/python3.10/site-packages/dlib/shape_predictor_68_face_landmarks.dat')
+
+# Modelos já carregados no processo atual (uma única instância por tipo e caminho, compartilhada por todos os
+# módulos) e travas que evitam que duas threads carreguem o mesmo modelo ao mesmo tempo
+loaded = dict()
+locks = dict()
+locks_guard = threading.Lock()
+
+def configure(cascade_path = None, predictor_path = None):
+    '''
+    Define os caminhos padrão dos modelos no processo atual, sem carregá-los.
+
+    Inputs:
+        cascade_path (str) -> Caminho dos pesos do detector de faces (None mantém o atual).
+        predictor_path (str) -> Caminho dos pesos do preditor de pontos faciais (None mantém o atual).
+    '''
+
+    global CASCADE_PATH, PREDICTOR_PATH
+    if cascade_path is not None: CASCADE_PATH = cascade_path
+    if predictor_path is not None: PREDICTOR_PATH = predictor_path
+
+def load(kind, path, loader):
+    '''
+    Obtém um modelo do processo atual, carregando-o apenas no primeiro uso.
+
+    Inputs:
+        kind (str) -> Tipo do modelo.
+        path (str) -> Caminho dos pesos do modelo.
+        loader (function) -> Função que carrega o modelo a partir do caminho.
+
+    Returns:
+        model (object) -> Modelo carregado.
+    '''
+
+    key = (kind, path)
+    if key in loaded: return loaded[key]
+
+    with locks_guard:
+        lock = locks.setdefault(key, threading.Lock())
+    # Uma thread que pede o modelo durante o carregamento espera o resultado em vez de carregá-lo novamente
+    with lock:
+        if key not in loaded: loaded[key] = loader(path)
+    return loaded[key]
+
+def load_cascade(path):
+    cascade = cv2.CascadeClassifier(path)
+    if cascade.empty(): raise IOError(f'Erro para carregar o detector de faces: {path}')
+    return cascade
+
+def load_predictor(path):
+    # O dlib só é importado quando o preditor é necessário
+    import dlib
+    return dlib.shape_predictor(path)
+
+def get_cascade(path = None):
+    '''
+    Obtém o detector de faces em cascata (Local Binary Patterns Improved) do processo atual.
+
+    Inputs:
+        path (str) -> Caminho dos pesos (padrão: caminho configurado).
+
+    Returns:
+        face_cascade (CascadeClassifier) -> Detector de faces carregado.
+    '''
+
+    return load('cascade', path or CASCADE_PATH, load_cascade)
+
+def get_predictor(path = None):
+    '''
+    Obtém o preditor de pontos faciais (Face Landmarks - 68 points) do processo atual.
+
+    Inputs:
+        path (str) -> Caminho dos pesos (padrão: caminho configurado).
+
+    Returns:
+        predictor (shape_predictor) -> Preditor de pontos faciais carregado.
+    '''
+
+    return load('predictor', path or PREDICTOR_PATH, load_predictor)
+
+def preload(cascade_path = None, predictor_path = None):
+    '''
+    Carrega os dois modelos em uma thread em segundo plano, permitindo abrir a câmera e exibir os primeiros
+    quadros durante o carregamento.
+
+    Inputs:
+        cascade_path (str) -> Caminho dos pesos do detector de faces (padrão: caminho configurado).
+        predictor_path (str) -> Caminho dos pesos do preditor de pontos faciais (padrão: caminho configurado).
+
+    Returns:
+        future (Future) -> Resultado (face_cascade, predictor) do carregamento, ou o erro ocorrido.
+    '''
+
+    future = concurrent.futures.Future()
+
+    def run():
+        try: future.set_result((get_cascade(cascade_path), get_predictor(predictor_path)))
+        except Exception as error: future.set_exception(error)
+
+    threading.Thread(target = run, daemon = True).start()
+    return future
@@ -0,0 +1,202 @@
+import concurrent.futures
+import argparse
+import csv
+import os
+import cv2
+
+import model_loader
+import face_utils
+import pipeline
+import bpm
+
+def load_models(cascade_path = None, predictor_path = None):
+    '''
+    Configura os modelos de detecção facial e de pontos faciais no processo atual (inicializador do pool).
+    Os modelos são carregados apenas no primeiro uso e mantidos em uma única instância por processo, de modo
+    que o pool é criado sem esperar o carregamento.
+
+    Inputs:
+        cascade_path (str) -> Caminho dos pesos do detector de faces (padrão: caminho configurado).
+        predictor_path (str) -> Caminho dos pesos do preditor de pontos faciais (padrão: caminho configurado).
+    '''
+
+    # Cada processo utiliza apenas uma thread do OpenCV para não competir com os demais processos
+    cv2.setNumThreads(1)
+    model_loader.configure(cascade_path, predictor_path)
+
+def video_info(path):
+    '''
+    Obtém o FPS real e a quantidade de quadros do arquivo de vídeo.
+
+    Inputs:
+        path (str) -> Caminho do arquivo de vídeo.
+
+    Returns:
+        fps (float) -> FPS informado pelo contêiner do vídeo.
+        frame_count (int) -> Quantidade de quadros do vídeo.
+    '''
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f'Erro para abrir o arquivo de vídeo: {path}')
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    if not fps or fps <= 0:
+        raise IOError(f'O arquivo de vídeo não informa o FPS: {path}')
+
+    return fps, frame_count
+
+def warmup_frames(fps):
+    '''
+    Quantidade de quadros necessária para que o estimador produza um BPM completo, utilizada como
+    sobreposição entre trechos consecutivos de um mesmo vídeo.
+
+    Inputs:
+        fps (float) -> FPS do vídeo.
+
+    Returns:
+        frames (int) -> Quantidade de quadros de aquecimento.
+    '''
+
+    estimator = bpm.BPMFourier(width = 1, height = 1, frame_rate = fps)
+    return estimator.bufferSize + estimator.bpmBufferSize * estimator.bpmCalculationFrequency
+
+def split_chunks(path, chunk_seconds):
+    '''
+    Divide um vídeo em trechos com sobreposição de aquecimento.
+
+    Inputs:
+        path (str) -> Caminho do arquivo de vídeo.
+        chunk_seconds (float) -> Duração de cada trecho em segundos (0 para não dividir).
+
+    Returns:
+        chunks (list) -> Lista de tarefas (caminho, fps, quadro de leitura, início, fim).
+    '''
+
+    fps, frame_count = video_info(path)
+    chunk_frames = int(chunk_seconds * fps) if chunk_seconds > 0 else frame_count
+    chunk_frames = max(chunk_frames, 1)
+    overlap = warmup_frames(fps)
+
+    chunks = list()
+    for start in range(0, max(frame_count, 1), chunk_frames):
+        # Cada trecho começa a ler 'overlap' quadros antes do seu início para aquecer o estimador
+        chunks.append((path, fps, max(0, start - overlap), start, min(start + chunk_frames, frame_count)))
+
+    return chunks
+
+def process_chunk(path, fps, read_from, start, end, detection_interval = 10):
+    '''
+    Processa um trecho de vídeo sem interface gráfica e obtém a série de BPM por instante de tempo.
+
+    Inputs:
+        path (str) -> Caminho do arquivo de vídeo.
+        fps (float) -> FPS do vídeo.
+        read_from (int) -> Quadro a partir do qual a leitura começa (inclui o aquecimento).
+        start (int) -> Primeiro quadro cujo resultado é registrado.
+        end (int) -> Quadro final (exclusivo) do trecho.
+        detection_interval (int) -> Quantidade máxima de quadros entre duas detecções faciais.
+
+    Returns:
+        rows (list) -> Lista de linhas (instante em segundos, BPM combinado, BPM de cada região).
+    '''
+
+    face_tracker = face_utils.FaceTracker(face_cascade = model_loader.get_cascade(),
+                                          predictor = model_loader.get_predictor(),
+                                          detection_interval = detection_interval)
+    estimator = bpm.BPMMultiRegion(frame_rate = fps)
+    analysis = pipeline.FaceAnalysis(face_tracker)
+
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, read_from)
+
+    rows = list()
+    for index in range(read_from, end):
+        ret, frame = cap.read()
+        if not ret: break
+
+        item = analysis({'index': index, 'timestamp': index / fps, 'frame': frame})
+        regions_data, bpm_data = None, None
+        if item['regions'] is not None:
+            try:
+                _, regions_data, bpm_data = estimator.update(regions = item['regions'], timestamp = item['timestamp'])
+            except cv2.error: pass
+
+        # Os quadros de aquecimento não são registrados
+        if index < start: continue
+
+        regions_data = [None] * len(estimator.sizes) if regions_data is None else list(regions_data)
+        rows.append([item['timestamp'], bpm_data] + regions_data)
+
+    cap.release()
+    return rows
+
+def write_series(path, rows):
+    '''
+    Escreve a série de BPM de um vídeo em um arquivo CSV.
+
+    Inputs:
+        path (str) -> Caminho do arquivo CSV de saída.
+        rows (list) -> Linhas (instante em segundos, BPM combinado, BPM de cada região).
+    '''
+
+    with open(path, 'w', newline = '') as file:
+        writer = csv.writer(file)
+        writer.writerow(['timestamp', 'bpm', 'bpm_forehead', 'bpm_cheek1', 'bpm_cheek2'])
+        for row in rows:
+            writer.writerow(['' if value is None else round(float(value), 4) for value in row])
+
+def process_videos(paths, output_dir, workers = None, chunk_seconds = 60, detection_interval = 10,
+                   cascade_path = None, predictor_path = None):
+    '''
+    Processa vários vídeos distribuindo os trechos entre um pool de processos e escreve um CSV por vídeo.
+
+    Inputs:
+        paths (list) -> Caminhos dos arquivos de vídeo.
+        output_dir (str) -> Diretório onde os arquivos CSV são escritos.
+        workers (int) -> Quantidade de processos (padrão: quantidade de núcleos).
+        chunk_seconds (float) -> Duração de cada trecho em segundos (0 para não dividir os vídeos).
+        detection_interval (int) -> Quantidade máxima de quadros entre duas detecções faciais.
+        cascade_path (str) -> Caminho dos pesos do detector de faces (padrão: caminho configurado).
+        predictor_path (str) -> Caminho dos pesos do preditor de pontos faciais (padrão: caminho configurado).
+
+    Returns:
+        outputs (list) -> Caminhos dos arquivos CSV escritos.
+    '''
+
+    os.makedirs(output_dir, exist_ok = True)
+    chunks = {path: split_chunks(path, chunk_seconds) for path in paths}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = load_models,
+                                                initargs = (cascade_path, predictor_path)) as executor:
+        futures = {path: [executor.submit(process_chunk, *chunk, detection_interval) for chunk in path_chunks]
+                   for path, path_chunks in chunks.items()}
+
+        outputs = list()
+        for path, path_futures in futures.items():
+            # Junta os trechos do vídeo na ordem original
+            rows = [row for future in path_futures for row in future.result()]
+            output = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.csv')
+            write_series(output, rows)
+            outputs.append(output)
+            print(f'{path}: {len(rows)} quadros -> {output}')
+
+    return outputs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Processa vídeos gravados e escreve a série de BPM de cada um.')
+    parser.add_argument('videos', nargs = '+', help = 'arquivos de vídeo')
+    parser.add_argument('--output-dir', default = 'bpm_series', help = 'diretório dos arquivos CSV de saída')
+    parser.add_argument('--workers', type = int, default = None, help = 'quantidade de processos')
+    parser.add_argument('--chunk-seconds', type = float, default = 60, help = 'duração de cada trecho (0 para não dividir)')
+    parser.add_argument('--detection-interval', type = int, default = 10, help = 'quadros entre detecções faciais')
+    parser.add_argument('--cascade', default = model_loader.CASCADE_PATH)
+    parser.add_argument('--predictor', default = model_loader.PREDICTOR_PATH)
+    args = parser.parse_args()
+
+    process_videos(args.videos, args.output_dir, workers = args.workers, chunk_seconds = args.chunk_seconds,
+                   detection_interval = args.detection_interval, cascade_path = args.cascade,
+                   predictor_path = args.predictor)
@@ -0,0 +1,348 @@
+import collections
+import threading
+import time
+import cv2
+
+import face_utils
+import metrics
+import utils
+import bpm
+
+class DropQueue:
+    '''
+    Fila limitada entre dois estágios do pipeline com política explícita de descarte.
+
+    Políticas:
+        'oldest' -> quando cheia, descarta o item mais antigo (o produtor nunca bloqueia).
+        'newest' -> quando cheia, descarta o item que está chegando (o produtor nunca bloqueia).
+        'block' -> quando cheia, o produtor espera até haver espaço.
+
+    Os instantes de captura dos quadros descartados são registrados em 'dropped_timestamps'.
+    '''
+
+    def __init__(self, name, maxsize = 2, policy = 'oldest', history = 1000):
+        '''
+        Construtor da classe
+
+        Inputs:
+            name (str) -> Nome da fila (utilizado nas estatísticas).
+            maxsize (int) -> Quantidade máxima de itens na fila.
+            policy (str) -> Política de descarte ('oldest', 'newest' ou 'block').
+            history (int) -> Quantidade de instantes de descarte mantidos no histórico.
+        '''
+
+        if policy not in ('oldest', 'newest', 'block'):
+            raise ValueError(f'Política de descarte inválida: {policy}')
+
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.closed = False
+
+        # Contadores de itens recebidos e descartados e instantes de captura dos quadros descartados
+        self.put_count = 0
+        self.drop_count = 0
+        self.max_depth = 0
+        self.dropped_timestamps = collections.deque(maxlen = history)
+
+    def put(self, item):
+        '''
+        Adiciona um item na fila aplicando a política de descarte.
+
+        Inputs:
+            item (dict) -> Pacote do quadro, contendo ao menos a chave 'timestamp'.
+        '''
+
+        with self.condition:
+            if self.policy == 'block':
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.condition.wait()
+            elif len(self.items) >= self.maxsize:
+                # Descarta o item mais antigo ou o item que está chegando, registrando o instante de captura
+                dropped = self.items.popleft() if self.policy == 'oldest' else item
+                self.drop_count += 1
+                self.dropped_timestamps.append(dropped['timestamp'])
+                if dropped is item: return
+
+            self.items.append(item)
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.condition.notify_all()
+
+    def get(self):
+        '''
+        Obtém o próximo item da fila, aguardando se estiver vazia.
+
+        Returns:
+            item (dict) -> Pacote do quadro ou None se a fila foi fechada e está vazia.
+        '''
+
+        with self.condition:
+            while not self.items and not self.closed:
+                self.condition.wait()
+            if not self.items: return None
+
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        '''
+        Fecha a fila, liberando os estágios que aguardam por itens.
+        '''
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def stats(self):
+        '''
+        Obtém as estatísticas da fila.
+
+        Returns:
+            stats (dict) -> Profundidade atual e máxima, itens recebidos e descartados.
+        '''
+
+        with self.condition:
+            return {'depth': len(self.items), 'max_depth': self.max_depth,
+                    'puts': self.put_count, 'drops': self.drop_count}
+
+class CaptureWorker(threading.Thread):
+    '''
+    Estágio de captura: lê os quadros do dispositivo e registra o instante de captura de cada um.
+    '''
+
+    def __init__(self, cap, output_queue):
+        super().__init__(name = 'capture', daemon = True)
+        self.cap = cap
+        self.output_queue = output_queue
+        self.stop_event = threading.Event()
+
+    def run(self):
+        index = 0
+        while not self.stop_event.is_set():
+            ret, frame = self.cap.read()
+            if not ret: break
+
+            self.output_queue.put({'index': index, 'timestamp': time.monotonic(), 'frame': frame})
+            index += 1
+
+        self.output_queue.close()
+
+class StageWorker(threading.Thread):
+    '''
+    Estágio genérico do pipeline: aplica uma função a cada item da fila de entrada e envia o resultado
+    para a fila de saída. Itens que geram exceção são contabilizados em 'errors' e descartados.
+    '''
+
+    def __init__(self, name, function, input_queue, output_queue, runtime_metrics):
+        super().__init__(name = name, daemon = True)
+        self.function = function
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.runtime_metrics = runtime_metrics
+        self.errors = 0
+
+    def run(self):
+        while True:
+            item = self.input_queue.get()
+            if item is None: break
+
+            try:
+                with self.runtime_metrics.stage(self.name):
+                    item = self.function(item)
+            except Exception:
+                self.errors += 1
+                self.runtime_metrics.count(f'{self.name}_errors')
+                continue
+
+            self.output_queue.put(item)
+
+        self.output_queue.close()
+
+class ThreadedPipeline:
+    '''
+    Executa a captura e cada estágio de processamento em threads separadas, conectadas por filas limitadas.
+    A fila da captura descarta o quadro mais antigo, de modo que a captura nunca bloqueia; as filas
+    intermediárias bloqueiam para não perder amostras já analisadas; a fila de saída (renderização)
+    mantém apenas os quadros mais recentes.
+    '''
+
+    def __init__(self, cap, stages, queue_size = 2, runtime_metrics = None):
+        '''
+        Construtor da classe
+
+        Inputs:
+            cap (VideoCapture) -> Dispositivo de captura de entrada.
+            stages (list) -> Lista de pares (nome, função) aplicados em sequência a cada quadro.
+            queue_size (int) -> Tamanho máximo de cada fila.
+            runtime_metrics (Metrics) -> Instrumentação do tempo de cada estágio e das filas (padrão: desativada).
+        '''
+
+        self.runtime_metrics = metrics.Metrics(enabled = False) if runtime_metrics is None else runtime_metrics
+
+        # A fila de entrada de cada estágio recebe o nome do estágio; a última fila alimenta a renderização
+        names = [name for name, _ in stages] + ['render']
+        policies = ['oldest'] + ['block'] * (len(stages) - 1) + ['oldest']
+        self.queues = [DropQueue(name, queue_size, policy) for name, policy in zip(names, policies)]
+
+        self.capture = CaptureWorker(cap, self.queues[0])
+        self.workers = [StageWorker(name, function, self.queues[index], self.queues[index + 1], self.runtime_metrics)
+                        for index, (name, function) in enumerate(stages)]
+
+    def start(self):
+        '''
+        Inicia as threads de captura e processamento.
+        '''
+
+        self.capture.start()
+        for worker in self.workers: worker.start()
+
+    def stop(self):
+        '''
+        Interrompe a captura e fecha as filas.
+        '''
+
+        self.capture.stop_event.set()
+        for output_queue in self.queues: output_queue.close()
+
+    def results(self):
+        '''
+        Itera sobre os quadros processados por todos os estágios, na thread de quem chama.
+        '''
+
+        while True:
+            item = self.queues[-1].get()
+            if item is None: return
+
+            # Registra a profundidade e os descartes de cada fila junto com o fim do quadro
+            if self.runtime_metrics.enabled:
+                for output_queue in self.queues:
+                    self.runtime_metrics.gauge(f'queue_{output_queue.name}_depth', len(output_queue.items))
+                    self.runtime_metrics.gauge(f'queue_{output_queue.name}_drops', output_queue.drop_count)
+                self.runtime_metrics.tick()
+
+            yield item
+
+    def stats(self):
+        '''
+        Obtém as estatísticas de cada fila e a quantidade de erros de cada estágio.
+
+        Returns:
+            stats (dict) -> Estatísticas indexadas pelo nome da fila.
+        '''
+
+        stats = {output_queue.name: output_queue.stats() for output_queue in self.queues}
+        for worker in self.workers: stats[worker.name]['errors'] = worker.errors
+        return stats
+
+def preprocess(item):
+    '''
+    Normaliza as dimensões, espelha o quadro e obtém a imagem em escala de cinza.
+    '''
+
+    frame = cv2.resize(src = item['frame'], dsize = (640, 480))
+    frame = cv2.flip(src = frame, flipCode = 1)
+    item['frame'] = frame
+    item['gray'] = cv2.cvtColor(src = frame, code = cv2.COLOR_BGR2GRAY)
+    return item
+
+class FaceAnalysis:
+    '''
+    Estágio de análise facial: obtém a face, os pontos faciais e as regiões da testa e das bochechas.
+    '''
+
+    def __init__(self, face_tracker):
+        self.face_tracker = face_tracker
+
+    def __call__(self, item):
+        item = preprocess(item)
+        faces, facial_points = self.face_tracker.update(gray_image = item['gray'])
+        item['faces'], item['facial_points'] = faces, facial_points
+        item['coords'], item['regions'] = None, None
+
+        if facial_points is not None:
+            points_ref = face_utils.get_reference_points(facial_points)
+            item['coords'] = face_utils.get_facial_analisis_coords(points_ref)
+            item['regions'] = face_utils.extract_local_regions(image = item['frame'], coords_facial_locals = item['coords'])
+
+        return item
+
+class BPMEstimation:
+    '''
+    Estágio de estimação do BPM a partir das regiões da testa e das bochechas.
+    '''
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def __call__(self, item):
+        item['bpm'] = None
+        if item['regions'] is not None:
+            try:
+                _, _, item['bpm'] = self.estimator.update(regions = item['regions'], timestamp = item['timestamp'])
+            except cv2.error: pass
+
+        return item
+
+def render(item):
+    '''
+    Desenha as informações da análise sobre o quadro.
+    '''
+
+    frame = item['frame']
+    info_detection = face_utils.draw_rectangle_face(image = frame, faces = item['faces'])
+
+    if item['facial_points'] is not None:
+        face_utils.draw_landmarks(image = frame, facial_points = item['facial_points'])
+        face_utils.draw_rectangle_facial_locals(image = frame, coords_facial_locals = item['coords'])
+
+        bpm_text = 'Calculando' if item['bpm'] is None else f'{round(float(item["bpm"]), 2)}'
+        cv2.putText(img = frame, text = f'Batimento por Minuto: {bpm_text}', org = (5, 460),
+                    fontFace = cv2.FONT_HERSHEY_SIMPLEX, fontScale = 1, color = [0, 0, 255],
+                    thickness = 2)
+
+    utils.text_image(image = frame, detection_flag = info_detection)
+    return frame
+
+if __name__ == '__main__':
+    import model_loader
+
+    # Os modelos são carregados em segundo plano enquanto a câmera é aberta
+    models_loading = model_loader.preload()
+
+    # Dispositivo de captura de entrada (0 -> dispositivo padrão de webcam)
+    cap = cv2.VideoCapture(0)
+    if not cap.isOpened():
+        print('Erro para inicializar a entrada de vídeo.')
+        exit()
+
+    # Arquiteturas de detecção facial e de pontos faciais (caminhos configurados em model_loader)
+    face_cascade, predictor_landmarks = models_loading.result()
+    runtime_metrics = metrics.Metrics(enabled = False, path = 'metrics.json')
+    face_tracker = face_utils.FaceTracker(face_cascade = face_cascade, predictor = predictor_landmarks,
+                                          detection_interval = 10, runtime_metrics = runtime_metrics)
+
+    # Captura, análise facial e estimação do BPM em threads separadas; a renderização ocorre na thread principal
+    pipeline = ThreadedPipeline(cap, stages = [('analysis', FaceAnalysis(face_tracker)),
+                                               ('bpm', BPMEstimation(bpm.BPMMultiRegion()))],
+                                runtime_metrics = runtime_metrics)
+    pipeline.start()
+
+    # Desenha apenas um a cada 2 quadros; com 'headless = True' a renderização só ocorre sob demanda (SIGUSR1)
+    renderer = utils.Renderer(every = 2, headless = False)
+    for item in pipeline.results():
+        if renderer.due(): renderer.show(render(item))
+        if renderer.poll_key() == ord('q'): break
+
+    pipeline.stop()
+
+    # Informa a profundidade e os descartes de cada fila
+    for name, stats in pipeline.stats().items():
+        print(f'{name}: {stats}')
+
+    cap.release()
+    renderer.close()
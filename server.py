@@ -0,0 +1,468 @@
+import concurrent.futures
+import multiprocessing
+import argparse
+import asyncio
+import struct
+import json
+import time
+import numpy as np
+import cv2
+
+import model_loader
+import face_utils
+import pipeline
+import bpm
+
+# Protocolo: cada mensagem é composta por 4 bytes (big-endian) com o tamanho do cabeçalho, o cabeçalho em
+# JSON e os dados binários concatenados, cujos tamanhos são informados na chave 'sizes' do cabeçalho.
+#
+# Cliente -> servidor:
+#     {'type': 'open', 'mode': 'frame' | 'rois', 'frame_rate': 60} -> abre a sessão da conexão.
+#     {'type': 'frame', 'timestamp': t} + quadro JPEG -> quadro completo (detecção e regiões no servidor).
+#     {'type': 'rois', 'timestamp': t, 'encoding': 'raw' | 'jpeg', 'shapes': [...]} + recortes da testa e
+#         das bochechas (arrays uint8 com as dimensões de 'shapes' ou imagens JPEG).
+#     {'type': 'close'} -> encerra a sessão.
+#
+# Servidor -> cliente:
+#     {'type': 'opened', 'session': id, 'worker': índice}
+#     {'type': 'bpm', 'index': i, 'timestamp': t, 'bpm': valor ou None, 'regions': [...], 'dropped': n}
+#     {'type': 'error', 'message': texto} e {'type': 'evicted'} (sessão ociosa descartada).
+
+HEADER = struct.Struct('>I')
+
+def encode_message(header, payloads = ()):
+    '''
+    Codifica uma mensagem do protocolo.
+
+    Inputs:
+        header (dict) -> Cabeçalho da mensagem.
+        payloads (list) -> Dados binários anexados à mensagem.
+
+    Returns:
+        message (bytes) -> Mensagem codificada.
+    '''
+
+    header = dict(header, sizes = [len(payload) for payload in payloads])
+    header_bytes = json.dumps(header).encode()
+    return b''.join([HEADER.pack(len(header_bytes)), header_bytes, *payloads])
+
+async def read_message(reader):
+    '''
+    Lê uma mensagem do protocolo.
+
+    Inputs:
+        reader (StreamReader) -> Fluxo de leitura da conexão.
+
+    Returns:
+        message (tuple) -> Cabeçalho e lista de dados binários, ou None se a conexão foi encerrada.
+    '''
+
+    try:
+        size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+        header = json.loads(await reader.readexactly(size))
+        payloads = [await reader.readexactly(length) for length in header.get('sizes', [])]
+    except asyncio.IncompleteReadError: return None
+
+    return header, payloads
+
+# Estado das sessões fixadas no processo atual (cada processo do pool atende apenas as suas sessões)
+sessions = dict()
+
+def worker_open(session_id, mode, frame_rate, cascade_path, predictor_path, detection_interval):
+    '''
+    Cria o estado de uma sessão no processo de trabalho.
+    '''
+
+    state = {'estimator': bpm.BPMMultiRegion(frame_rate = frame_rate)}
+    if mode == 'frame':
+        # Os modelos são carregados uma única vez por processo, na primeira sessão de quadros completos
+        face_tracker = face_utils.FaceTracker(face_cascade = model_loader.get_cascade(cascade_path),
+                                              predictor = model_loader.get_predictor(predictor_path),
+                                              detection_interval = detection_interval)
+        state['analysis'] = pipeline.FaceAnalysis(face_tracker)
+
+    sessions[session_id] = state
+
+def worker_close(session_id):
+    '''
+    Descarta o estado de uma sessão no processo de trabalho.
+    '''
+
+    sessions.pop(session_id, None)
+
+def decode_regions(header, payloads):
+    '''
+    Decodifica os recortes da testa e das bochechas enviados pelo cliente.
+    '''
+
+    if header.get('encoding', 'raw') == 'jpeg':
+        return [cv2.imdecode(np.frombuffer(payload, dtype = np.uint8), cv2.IMREAD_COLOR) for payload in payloads]
+
+    return [np.frombuffer(payload, dtype = np.uint8).reshape(shape) for payload, shape in zip(payloads, header['shapes'])]
+
+def worker_process(session_id, header, payloads):
+    '''
+    Decodifica a mensagem, obtém as regiões (detectando a face se necessário) e atualiza o estimador
+    da sessão no processo de trabalho.
+
+    Inputs:
+        session_id (int) -> Identificador da sessão.
+        header (dict) -> Cabeçalho da mensagem ('frame' ou 'rois').
+        payloads (list) -> Quadro JPEG ou recortes das regiões.
+
+    Returns:
+        result (dict) -> BPM combinado e BPM de cada região (None enquanto estiver calculando).
+    '''
+
+    state = sessions[session_id]
+    timestamp = header.get('timestamp')
+
+    if header['type'] == 'frame':
+        frame = cv2.imdecode(np.frombuffer(payloads[0], dtype = np.uint8), cv2.IMREAD_COLOR)
+        if frame is None: return {'type': 'error', 'message': 'Quadro JPEG inválido.'}
+        item = state['analysis']({'index': 0, 'timestamp': timestamp, 'frame': frame})
+        regions = item['regions']
+        if regions is None: return {'type': 'bpm', 'bpm': None, 'regions': None, 'face': False}
+    else:
+        regions = decode_regions(header, payloads)
+        # A sessão estima o BPM da testa e das duas bochechas: cada mensagem deve trazer as três regiões
+        if len(regions) != len(state['estimator'].sizes):
+            return {'type': 'error', 'message': f'Quantidade de regiões inválida: {len(regions)} '
+                                                f'(esperadas {len(state["estimator"].sizes)}).'}
+
+    try:
+        _, regions_data, bpm_data = state['estimator'].update(regions = regions, timestamp = timestamp)
+    except cv2.error:
+        return {'type': 'error', 'message': 'Regiões vazias ou inválidas.'}
+
+    return {'type': 'bpm', 'bpm': None if bpm_data is None else float(bpm_data),
+            'regions': None if regions_data is None else [float(value) for value in regions_data], 'face': True}
+
+class Session:
+    '''
+    Sessão de um cliente: fila de mensagens pendentes e processo de trabalho ao qual o estado está fixado.
+    '''
+
+    def __init__(self, session_id, worker, writer, queue_size):
+        self.id = session_id
+        self.worker = worker
+        self.writer = writer
+        # Fila limitada: se o processamento não acompanhar o cliente, a mensagem mais antiga é descartada
+        self.queue = asyncio.Queue(maxsize = queue_size)
+        self.last_active = time.monotonic()
+        self.index = 0
+        self.dropped = 0
+        self.task = None
+        self.closed = False
+
+class BPMServer:
+    '''
+    Servidor local (TCP ou socket Unix) que atende vários clientes ao mesmo tempo. Cada conexão abre uma
+    sessão com seu próprio estimador, mantido em um único processo de trabalho durante toda a sessão para
+    que o estado nunca seja transferido entre processos. A decodificação, a detecção facial e a FFT são
+    executadas nos processos; o laço assíncrono apenas recebe, enfileira e responde as mensagens.
+    Sessões sem mensagens por mais de 'max_idle' segundos são descartadas.
+    '''
+
+    def __init__(self, workers = 2, queue_size = 4, max_idle = 30.0, detection_interval = 10,
+                 cascade_path = None, predictor_path = None):
+        '''
+        Construtor da classe
+
+        Inputs:
+            workers (int) -> Quantidade de processos de trabalho.
+            queue_size (int) -> Quantidade máxima de mensagens pendentes por sessão.
+            max_idle (float) -> Tempo (s) sem mensagens antes de descartar uma sessão.
+            detection_interval (int) -> Quantidade máxima de quadros entre duas detecções faciais.
+            cascade_path (str) -> Caminho dos pesos do detector de faces (padrão: caminho configurado).
+            predictor_path (str) -> Caminho dos pesos do preditor de pontos faciais (padrão: caminho configurado).
+        '''
+
+        self.queue_size = queue_size
+        self.max_idle = max_idle
+        self.detection_interval = detection_interval
+        self.cascade_path = cascade_path
+        self.predictor_path = predictor_path
+
+        # Os processos não são criados por 'fork': um processo copiado do servidor herdaria os sockets dos
+        # clientes já conectados, e as conexões encerradas pelo servidor continuariam abertas nos processos
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.context = multiprocessing.get_context(method)
+        # Um executor de um único processo por trabalhador permite fixar cada sessão em um processo
+        self.executors = [self.create_executor() for _ in range(workers)]
+        self.sessions = dict()
+        # Aberturas de sessão ainda em andamento em cada processo, contadas na escolha do processo
+        self.pending = [0] * workers
+        self.next_id = 0
+        self.evicted = 0
+
+    def create_executor(self):
+        return concurrent.futures.ProcessPoolExecutor(max_workers = 1, mp_context = self.context)
+
+    def least_loaded(self):
+        '''
+        Obtém o processo de trabalho com menos sessões abertas ou em abertura.
+        '''
+
+        load = list(self.pending)
+        for session in self.sessions.values(): load[session.worker] += 1
+        return load.index(min(load))
+
+    async def send(self, session, header):
+        '''
+        Envia uma mensagem ao cliente, ignorando conexões já encerradas.
+        '''
+
+        if session.writer.is_closing(): return
+        session.writer.write(encode_message(header))
+        try: await session.writer.drain()
+        except ConnectionError: pass
+
+    async def open_session(self, header, writer):
+        '''
+        Abre uma sessão no processo de trabalho menos carregado.
+        '''
+
+        mode = header.get('mode', 'rois')
+        if mode not in ('frame', 'rois'):
+            raise ValueError(f'Modo de sessão inválido: {mode}')
+
+        session = Session(self.next_id, self.least_loaded(), writer, self.queue_size)
+        self.next_id += 1
+
+        # O processo é reservado antes de aguardar a abertura, para que aberturas simultâneas sejam distribuídas
+        self.pending[session.worker] += 1
+        loop = asyncio.get_running_loop()
+        executor = self.executors[session.worker]
+        try:
+            await loop.run_in_executor(executor, worker_open, session.id, mode, header.get('frame_rate', 60),
+                                       self.cascade_path, self.predictor_path, self.detection_interval)
+        except concurrent.futures.process.BrokenProcessPool:
+            self.replace_worker(session.worker, executor)
+            raise
+        finally: self.pending[session.worker] -= 1
+
+        self.sessions[session.id] = session
+        session.task = asyncio.create_task(self.run_session(session))
+        return session
+
+    async def close_session(self, session):
+        '''
+        Encerra uma sessão e descarta o seu estado no processo de trabalho.
+        '''
+
+        if session is None or session.closed: return
+        session.closed = True
+        self.sessions.pop(session.id, None)
+        # A própria tarefa da sessão não é cancelada quando é ela que encerra a sessão
+        if session.task is not None and session.task is not asyncio.current_task(): session.task.cancel()
+
+        loop = asyncio.get_running_loop()
+        try: await loop.run_in_executor(self.executors[session.worker], worker_close, session.id)
+        except concurrent.futures.process.BrokenProcessPool: pass
+
+    def replace_worker(self, worker, executor):
+        '''
+        Substitui um processo de trabalho encerrado inesperadamente por um novo processo.
+        '''
+
+        if self.executors[worker] is not executor: return
+        executor.shutdown(wait = False)
+        self.executors[worker] = self.create_executor()
+
+    async def run_session(self, session):
+        '''
+        Processa em ordem as mensagens da sessão no seu processo de trabalho e envia o BPM ao cliente.
+        '''
+
+        loop = asyncio.get_running_loop()
+        executor = self.executors[session.worker]
+        while True:
+            index, header, payloads = await session.queue.get()
+            try:
+                result = await loop.run_in_executor(executor, worker_process, session.id, header, payloads)
+            # O processo de trabalho foi encerrado e o estado da sessão foi perdido: o cliente é avisado, o
+            # processo é substituído para as próximas sessões e a sessão é encerrada
+            except concurrent.futures.process.BrokenProcessPool as error:
+                await self.send(session, {'type': 'error', 'message': f'Processo de trabalho encerrado: {error}',
+                                          'index': index, 'timestamp': header.get('timestamp'),
+                                          'dropped': session.dropped})
+                self.replace_worker(session.worker, executor)
+                session.writer.close()
+                await self.close_session(session)
+                return
+            # Mensagens malformadas ou inválidas são informadas ao cliente sem encerrar a sessão
+            except Exception as error:
+                result = {'type': 'error', 'message': str(error) or type(error).__name__}
+            result.update(index = index, timestamp = header.get('timestamp'), dropped = session.dropped)
+            await self.send(session, result)
+
+    async def handle(self, reader, writer):
+        '''
+        Atende uma conexão: abre a sessão e enfileira as mensagens recebidas até o cliente encerrar.
+        '''
+
+        session = None
+        try:
+            message = await read_message(reader)
+            if message is None: return
+            header, _ = message
+            if header.get('type') != 'open':
+                writer.write(encode_message({'type': 'error', 'message': 'A primeira mensagem deve abrir a sessão.'}))
+                return
+
+            try:
+                session = await self.open_session(header, writer)
+            # Modo inválido ou modelos indisponíveis no processo de trabalho
+            except Exception as error:
+                writer.write(encode_message({'type': 'error', 'message': str(error)}))
+                return
+            await self.send(session, {'type': 'opened', 'session': session.id, 'worker': session.worker})
+
+            while not session.closed:
+                message = await read_message(reader)
+                if message is None: break
+                header, payloads = message
+                if header.get('type') == 'close': break
+                if header.get('type') not in ('frame', 'rois'): continue
+
+                session.last_active = time.monotonic()
+                # Descarta a mensagem pendente mais antiga se o processamento não acompanhar o cliente
+                if session.queue.full():
+                    session.queue.get_nowait()
+                    session.dropped += 1
+                session.queue.put_nowait((session.index, header, payloads))
+                session.index += 1
+        except ConnectionError: pass
+        finally:
+            await self.close_session(session)
+            writer.close()
+
+    async def evict_idle(self):
+        '''
+        Descarta periodicamente as sessões sem mensagens por mais de 'max_idle' segundos.
+        '''
+
+        while True:
+            await asyncio.sleep(max(self.max_idle / 4, 0.1))
+            now = time.monotonic()
+            for session in [session for session in self.sessions.values() if now - session.last_active > self.max_idle]:
+                await self.send(session, {'type': 'evicted'})
+                await self.close_session(session)
+                session.writer.close()
+                self.evicted += 1
+
+    async def serve(self, host = '127.0.0.1', port = 8765, unix_path = None):
+        '''
+        Inicia o servidor e atende as conexões até ser interrompido.
+
+        Inputs:
+            host (str) -> Endereço TCP local.
+            port (int) -> Porta TCP.
+            unix_path (str) -> Caminho do socket Unix (substitui o endereço TCP).
+        '''
+
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path = unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host = host, port = port)
+
+        evictor = asyncio.create_task(self.evict_idle())
+        try:
+            async with server: await server.serve_forever()
+        finally:
+            evictor.cancel()
+            for executor in self.executors: executor.shutdown(cancel_futures = True)
+
+class BPMClient:
+    '''
+    Cliente assíncrono do servidor de BPM: abre uma sessão, envia quadros ou recortes e recebe as leituras.
+    '''
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+
+    @classmethod
+    async def connect(cls, host = '127.0.0.1', port = 8765, unix_path = None):
+        '''
+        Conecta ao servidor por TCP ou pelo socket Unix.
+        '''
+
+        if unix_path is not None: reader, writer = await asyncio.open_unix_connection(unix_path)
+        else: reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def open(self, mode = 'rois', frame_rate = 60):
+        '''
+        Abre a sessão e aguarda a confirmação do servidor.
+
+        Returns:
+            header (dict) -> Resposta do servidor ('opened' ou 'error').
+        '''
+
+        self.writer.write(encode_message({'type': 'open', 'mode': mode, 'frame_rate': frame_rate}))
+        await self.writer.drain()
+        header, _ = await read_message(self.reader)
+        if header['type'] == 'opened': self.session = header['session']
+        return header
+
+    async def send_rois(self, regions, timestamp = None):
+        '''
+        Envia os recortes (uint8) da testa e das bochechas sem compressão.
+        '''
+
+        regions = [np.ascontiguousarray(region, dtype = np.uint8) for region in regions]
+        header = {'type': 'rois', 'timestamp': timestamp, 'encoding': 'raw', 'shapes': [region.shape for region in regions]}
+        self.writer.write(encode_message(header, [region.tobytes() for region in regions]))
+        await self.writer.drain()
+
+    async def send_frame(self, frame, timestamp = None, quality = 90):
+        '''
+        Envia um quadro completo comprimido em JPEG.
+        '''
+
+        _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        self.writer.write(encode_message({'type': 'frame', 'timestamp': timestamp}, [jpeg.tobytes()]))
+        await self.writer.drain()
+
+    async def readings(self):
+        '''
+        Itera sobre as mensagens enviadas pelo servidor até a conexão ser encerrada.
+        '''
+
+        while True:
+            message = await read_message(self.reader)
+            if message is None: return
+            yield message[0]
+
+    async def close(self):
+        '''
+        Encerra a sessão e a conexão.
+        '''
+
+        try:
+            self.writer.write(encode_message({'type': 'close'}))
+            await self.writer.drain()
+        except ConnectionError: pass
+        self.writer.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Servidor local de BPM para vários clientes.')
+    parser.add_argument('--host', default = '127.0.0.1', help = 'endereço TCP local')
+    parser.add_argument('--port', type = int, default = 8765, help = 'porta TCP')
+    parser.add_argument('--unix', default = None, help = 'caminho do socket Unix (substitui o TCP)')
+    parser.add_argument('--workers', type = int, default = 2, help = 'quantidade de processos de trabalho')
+    parser.add_argument('--queue-size', type = int, default = 4, help = 'mensagens pendentes por sessão')
+    parser.add_argument('--max-idle', type = float, default = 30.0, help = 'segundos sem mensagens antes de descartar a sessão')
+    parser.add_argument('--detection-interval', type = int, default = 10, help = 'quadros entre detecções faciais')
+    parser.add_argument('--cascade', default = model_loader.CASCADE_PATH)
+    parser.add_argument('--predictor', default = model_loader.PREDICTOR_PATH)
+    args = parser.parse_args()
+
+    server = BPMServer(workers = args.workers, queue_size = args.queue_size, max_idle = args.max_idle,
+                       detection_interval = args.detection_interval, cascade_path = args.cascade,
+                       predictor_path = args.predictor)
+    try: asyncio.run(server.serve(host = args.host, port = args.port, unix_path = args.unix))
+    except KeyboardInterrupt: pass
@@ -0,0 +1,320 @@
+import concurrent.futures
+import itertools
+import argparse
+import json
+import os
+import numpy as np
+import cv2
+
+import model_loader
+import face_utils
+import pipeline
+import offline
+import bpm
+
+class TraceStore:
+    '''
+    Armazenamento em disco, mapeado em memória, das regiões faciais extraídas de um vídeo. Para cada quadro
+    são gravados o instante de captura e a média de cada canal de cada região em todos os níveis da pirâmide
+    gaussiana (0 a 'max_levels'), que é tudo o que o cálculo do BPM utiliza. Opcionalmente, os recortes
+    padronizados das regiões também são gravados. Quadros sem face possuem médias NaN.
+
+    Arquivos do diretório:
+        meta.json -> Quantidade de quadros, FPS, dimensões das regiões e quantidade de níveis.
+        timestamps.npy -> Instante de captura (s) de cada quadro.
+        means.npy -> Médias com dimensões (quadros, regiões, níveis + 1, canais).
+        crops_<r>.npy -> Recortes (uint8) da região r com dimensões (quadros, altura, largura, canais).
+    '''
+
+    def __init__(self, path, meta, timestamps, means, crops):
+        self.path = path
+        self.meta = meta
+        self.timestamps = timestamps
+        self.means = means
+        self.crops = crops
+        self.count = meta['frames']
+
+    @classmethod
+    def create(cls, path, capacity, fps, sizes = ((100, 40), (40, 25), (40, 25)), max_levels = 5, crops = False):
+        '''
+        Cria um armazenamento vazio com espaço para 'capacity' quadros.
+
+        Inputs:
+            path (str) -> Diretório do armazenamento.
+            capacity (int) -> Quantidade máxima de quadros.
+            fps (float) -> FPS do vídeo de origem.
+            sizes (list) -> Dimensões (largura, altura) padronizadas de cada região.
+            max_levels (int) -> Nível mais alto da pirâmide gaussiana armazenado.
+            crops (bool) -> Se verdadeiro, também grava os recortes das regiões.
+        '''
+
+        os.makedirs(path, exist_ok = True)
+        sizes = [(int(width), int(height)) for (width, height) in sizes]
+        meta = {'frames': 0, 'fps': fps, 'sizes': sizes, 'max_levels': max_levels, 'crops': crops}
+
+        open_memmap = np.lib.format.open_memmap
+        timestamps = open_memmap(os.path.join(path, 'timestamps.npy'), mode = 'w+', dtype = np.float64,
+                                 shape = (capacity,))
+        means = open_memmap(os.path.join(path, 'means.npy'), mode = 'w+', dtype = np.float64,
+                            shape = (capacity, len(sizes), max_levels + 1, 3))
+        crop_arrays = None
+        if crops:
+            crop_arrays = [open_memmap(os.path.join(path, f'crops_{index}.npy'), mode = 'w+', dtype = np.uint8,
+                                       shape = (capacity, height, width, 3))
+                           for index, (width, height) in enumerate(sizes)]
+
+        store = cls(path, meta, timestamps, means, crop_arrays)
+        store.write_meta()
+        return store
+
+    @classmethod
+    def open(cls, path):
+        '''
+        Abre um armazenamento existente apenas para leitura. Os arquivos são mapeados em memória, de modo
+        que vários processos compartilham as mesmas páginas do sistema operacional.
+        '''
+
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+
+        count = meta['frames']
+        timestamps = np.load(os.path.join(path, 'timestamps.npy'), mmap_mode = 'r')[:count]
+        means = np.load(os.path.join(path, 'means.npy'), mmap_mode = 'r')[:count]
+        crops = None
+        if meta['crops']:
+            crops = [np.load(os.path.join(path, f'crops_{index}.npy'), mmap_mode = 'r')[:count]
+                     for index in range(len(meta['sizes']))]
+
+        return cls(path, meta, timestamps, means, crops)
+
+    def append(self, timestamp, regions):
+        '''
+        Adiciona um quadro ao armazenamento.
+
+        Inputs:
+            timestamp (float) -> Instante de captura (s) do quadro.
+            regions (list) -> Recortes da testa e das bochechas ou None se nenhuma face foi encontrada.
+        '''
+
+        self.timestamps[self.count] = timestamp
+        self.means[self.count] = np.nan
+        if regions is not None:
+            for index, (region, size) in enumerate(zip(regions, self.meta['sizes'])):
+                # Recortes vazios (fora da imagem) são tratados como quadro sem face
+                if region.size == 0:
+                    self.means[self.count] = np.nan
+                    break
+                frame = cv2.resize(region, tuple(size))
+                self.means[self.count, index] = region_means(frame, self.meta['max_levels'])
+                if self.crops is not None: self.crops[index][self.count] = frame
+
+        self.count += 1
+
+    def write_meta(self):
+        '''
+        Grava os metadados e descarrega os arquivos mapeados no disco.
+        '''
+
+        self.meta['frames'] = self.count
+        self.timestamps.flush()
+        self.means.flush()
+        for crop in self.crops or []: crop.flush()
+
+        with open(os.path.join(self.path, 'meta.json'), 'w') as file:
+            json.dump(self.meta, file, indent = 2)
+
+    def trace(self, levels):
+        '''
+        Obtém a média espacial de cada região no nível 'levels' da pirâmide, como armazenada pela BPMMultiRegion.
+
+        Returns:
+            trace (array) -> Médias com dimensões (quadros, regiões), NaN nos quadros sem face.
+        '''
+
+        return self.means[:, :, levels, :].mean(axis = 2)
+
+def region_means(frame, max_levels):
+    '''
+    Calcula a média de cada canal de um recorte em todos os níveis da pirâmide gaussiana, com as mesmas
+    operações da BPMFourier.buildGauss.
+
+    Inputs:
+        frame (array) -> Recorte (uint8) com as dimensões padronizadas da região.
+        max_levels (int) -> Nível mais alto da pirâmide.
+
+    Returns:
+        means (array) -> Médias com dimensões (max_levels + 1, 3).
+    '''
+
+    means = np.zeros((max_levels + 1, 3))
+    for level in range(max_levels + 1):
+        if level > 0: frame = cv2.pyrDown(frame)
+        means[level] = frame.mean(axis = (0, 1))
+
+    return means
+
+def extract_video(path, output_dir, detection_interval = 10, max_levels = 5, crops = False):
+    '''
+    Executa a detecção facial e os pontos faciais uma única vez sobre um vídeo e grava as regiões no
+    armazenamento (executado em um processo do pool, com os modelos já carregados).
+
+    Inputs:
+        path (str) -> Caminho do arquivo de vídeo.
+        output_dir (str) -> Diretório onde o armazenamento do vídeo é criado.
+        detection_interval (int) -> Quantidade máxima de quadros entre duas detecções faciais.
+        max_levels (int) -> Nível mais alto da pirâmide gaussiana armazenado.
+        crops (bool) -> Se verdadeiro, também grava os recortes das regiões.
+
+    Returns:
+        store_path (str) -> Diretório do armazenamento criado.
+    '''
+
+    fps, frame_count = offline.video_info(path)
+    store_path = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0])
+    store = TraceStore.create(store_path, frame_count, fps, max_levels = max_levels, crops = crops)
+
+    face_tracker = face_utils.FaceTracker(face_cascade = model_loader.get_cascade(),
+                                          predictor = model_loader.get_predictor(),
+                                          detection_interval = detection_interval)
+    analysis = pipeline.FaceAnalysis(face_tracker)
+
+    cap = cv2.VideoCapture(path)
+    for index in range(frame_count):
+        ret, frame = cap.read()
+        if not ret: break
+        item = analysis({'index': index, 'timestamp': index / fps, 'frame': frame})
+        store.append(item['timestamp'], item['regions'])
+
+    cap.release()
+    store.write_meta()
+    return store_path
+
+def evaluate(store_path, settings, timestamps = True, reference_bpm = None):
+    '''
+    Reproduz o cálculo do BPM da BPMMultiRegion sobre um armazenamento com um conjunto de parâmetros.
+
+    Inputs:
+        store_path (str) -> Diretório do armazenamento.
+        settings (dict) -> Parâmetros do algoritmo ('levels', 'minFrequency', 'maxFrequency', 'bufferSize', ...).
+        timestamps (bool) -> Se verdadeiro, utiliza os instantes de captura (Lomb-Scargle), como o modo offline.
+        reference_bpm (float) -> BPM de referência para o cálculo do erro (opcional).
+
+    Returns:
+        result (dict) -> Parâmetros, cobertura das leituras, instante da primeira leitura, média, desvio
+                         padrão e erro absoluto médio do BPM.
+    '''
+
+    store = TraceStore.open(store_path)
+    trace = store.trace(settings.get('levels', 3))
+    estimator = bpm.BPMRegionTrace(regions = trace.shape[1], frame_rate = store.meta['fps'], **settings)
+
+    readings, first = list(), None
+    for index in range(store.count):
+        # Quadros sem face não atualizam o estimador, como no processamento ao vivo
+        if np.isnan(trace[index, 0]): continue
+        timestamp = float(store.timestamps[index])
+        _, bpm_data = estimator.update(trace[index], timestamp if timestamps else None)
+        if bpm_data is not None:
+            readings.append(bpm_data)
+            if first is None: first = timestamp
+
+    readings = np.array(readings)
+    result = {'settings': settings, 'coverage': len(readings) / max(store.count, 1), 'first_reading': first,
+              'mean': float(readings.mean()) if len(readings) else None,
+              'std': float(readings.std()) if len(readings) else None, 'mae': None}
+    if reference_bpm is not None and len(readings):
+        result['mae'] = float(np.abs(readings - reference_bpm).mean())
+
+    return result
+
+def sweep(store_paths, grid, workers = None, timestamps = True, reference_bpm = None):
+    '''
+    Avalia, em paralelo, todas as combinações de parâmetros da grade sobre cada armazenamento.
+
+    Inputs:
+        store_paths (list) -> Diretórios dos armazenamentos.
+        grid (dict) -> Lista de valores de cada parâmetro.
+        workers (int) -> Quantidade de processos (padrão: quantidade de núcleos).
+        timestamps (bool) -> Se verdadeiro, utiliza os instantes de captura (Lomb-Scargle).
+        reference_bpm (float) -> BPM de referência para o cálculo do erro (opcional).
+
+    Returns:
+        results (list) -> Resultado de cada combinação em cada armazenamento.
+    '''
+
+    names = list(grid)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        futures = [(store_path, executor.submit(evaluate, store_path, settings, timestamps, reference_bpm))
+                   for store_path in store_paths for settings in combinations]
+        results = list()
+        for store_path, future in futures:
+            result = future.result()
+            result['store'] = store_path
+            results.append(result)
+
+    return results
+
+def parse_values(text, kind):
+    '''
+    Converte uma lista de valores separados por vírgula.
+    '''
+
+    return [kind(value) for value in text.split(',')]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Extrai as regiões faciais uma única vez e varre parâmetros do estimador.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    extract_parser = commands.add_parser('extract', help = 'grava as regiões de cada vídeo em um armazenamento')
+    extract_parser.add_argument('videos', nargs = '+', help = 'arquivos de vídeo')
+    extract_parser.add_argument('--output-dir', default = 'traces', help = 'diretório dos armazenamentos')
+    extract_parser.add_argument('--workers', type = int, default = None, help = 'quantidade de processos')
+    extract_parser.add_argument('--detection-interval', type = int, default = 10, help = 'quadros entre detecções faciais')
+    extract_parser.add_argument('--max-levels', type = int, default = 5, help = 'nível mais alto da pirâmide armazenado')
+    extract_parser.add_argument('--crops', action = 'store_true', help = 'também grava os recortes das regiões')
+    extract_parser.add_argument('--cascade', default = model_loader.CASCADE_PATH)
+    extract_parser.add_argument('--predictor', default = model_loader.PREDICTOR_PATH)
+
+    sweep_parser = commands.add_parser('sweep', help = 'avalia uma grade de parâmetros sobre os armazenamentos')
+    sweep_parser.add_argument('stores', nargs = '+', help = 'diretórios dos armazenamentos')
+    sweep_parser.add_argument('--workers', type = int, default = None, help = 'quantidade de processos')
+    sweep_parser.add_argument('--levels', default = '3', help = 'valores de levels (ex.: 2,3,4)')
+    sweep_parser.add_argument('--min-frequency', default = '1.0', help = 'valores de minFrequency (Hz)')
+    sweep_parser.add_argument('--max-frequency', default = '2.0', help = 'valores de maxFrequency (Hz)')
+    sweep_parser.add_argument('--buffer-size', default = '150', help = 'valores de bufferSize (quadros)')
+    sweep_parser.add_argument('--bpm-calculation-frequency', default = '60', help = 'valores de bpmCalculationFrequency')
+    sweep_parser.add_argument('--no-timestamps', action = 'store_true', help = 'utiliza a FFT com o FPS do vídeo')
+    sweep_parser.add_argument('--reference-bpm', type = float, default = None, help = 'BPM de referência para o erro')
+    sweep_parser.add_argument('--output', default = None, help = 'arquivo JSON com todos os resultados')
+    args = parser.parse_args()
+
+    if args.command == 'extract':
+        os.makedirs(args.output_dir, exist_ok = True)
+        with concurrent.futures.ProcessPoolExecutor(max_workers = args.workers, initializer = offline.load_models,
+                                                    initargs = (args.cascade, args.predictor)) as executor:
+            futures = [executor.submit(extract_video, path, args.output_dir, args.detection_interval,
+                                       args.max_levels, args.crops) for path in args.videos]
+            for path, future in zip(args.videos, futures):
+                print(f'{path} -> {future.result()}')
+    else:
+        # O fator alpha só altera os quadros magnificados e não o BPM, por isso não faz parte da grade
+        grid = {'levels': parse_values(args.levels, int), 'minFrequency': parse_values(args.min_frequency, float),
+                'maxFrequency': parse_values(args.max_frequency, float), 'bufferSize': parse_values(args.buffer_size, int),
+                'bpmCalculationFrequency': parse_values(args.bpm_calculation_frequency, int)}
+        results = sweep(args.stores, grid, workers = args.workers, timestamps = not args.no_timestamps,
+                        reference_bpm = args.reference_bpm)
+
+        # Ordena pelo erro (quando houver referência) ou pela estabilidade das leituras
+        key = 'mae' if args.reference_bpm is not None else 'std'
+        results.sort(key = lambda result: np.inf if result[key] is None else result[key])
+        for result in results:
+            mean = '-' if result['mean'] is None else f'{result["mean"]:.2f}'
+            error = '-' if result[key] is None else f'{result[key]:.2f}'
+            print(f'{os.path.basename(result["store"]):>16} | {json.dumps(result["settings"])} | '
+                  f'cobertura {result["coverage"]:.2f} | BPM {mean} | {key} {error}')
+
+        if args.output is not None:
+            with open(args.output, 'w') as file:
+                json.dump(results, file, indent = 2)
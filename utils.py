@@ -1,4 +1,5 @@
 import datetime
+import signal
 import cv2
 
 def get_data_and_hour():
@@ -9,10 +10,8 @@ def get_data_and_hour():
         date_and_hour (str) -> string com as informações de data e hora.
     '''
 
-    actual_date = datetime.datetime.now().strftime('%d/%m/%Y')
-    actual_hour = datetime.datetime.now().strftime('%H:%M')
-
-    return f'[{actual_date}] - {actual_hour}'
+    # Consulta o relógio uma única vez para a data e a hora
+    return datetime.datetime.now().strftime('[%d/%m/%Y] - %H:%M')
 
 def text_image(image, detection_flag):
     '''
@@ -42,3 +41,90 @@ def text_image(image, detection_flag):
                 fontFace = cv2.FONT_HERSHEY_SIMPLEX, fontScale = 0.5, color = [0, 255, 0],
                 thickness = 1)
 
+
+class Renderer:
+    '''
+    Controla quando o quadro de saída é desenhado e exibido, separando a renderização da análise.
+    Com 'every' igual a N, apenas um a cada N quadros é desenhado; com 'every' igual a 0, os quadros só
+    são desenhados quando solicitados por 'request' (ou pelo sinal SIGUSR1). No modo sem display
+    ('headless'), nenhuma janela é aberta e os quadros solicitados são salvos em 'snapshot_path'.
+    '''
+
+    def __init__(self, window_name = 'Batimento Cardiaco - PDS Projeto', every = 1, headless = False,
+                 snapshot_path = 'snapshot.png'):
+        '''
+        Construtor da classe
+
+        Inputs:
+            window_name (str) -> Nome da janela de exibição.
+            every (int) -> Intervalo de quadros entre duas renderizações (0 para renderizar apenas sob demanda).
+            headless (bool) -> Desativa a janela de exibição e a leitura do teclado.
+            snapshot_path (str) -> Arquivo onde os quadros solicitados são salvos no modo sem display.
+        '''
+
+        self.window_name = window_name
+        self.every = every
+        self.headless = headless
+        self.snapshot_path = snapshot_path
+
+        self.frame_count = 0
+        self.rendered = 0
+        self.requested = False
+
+        # Permite solicitar um quadro externamente com 'kill -USR1 <pid>' (apenas em sistemas POSIX)
+        if hasattr(signal, 'SIGUSR1'):
+            try: signal.signal(signal.SIGUSR1, lambda signum, frame: self.request())
+            except ValueError: pass
+
+    def request(self):
+        '''
+        Solicita que o próximo quadro seja desenhado e exibido (ou salvo, no modo sem display).
+        '''
+
+        self.requested = True
+
+    def due(self):
+        '''
+        Informa se o quadro atual deve ser desenhado. Deve ser chamado uma vez por quadro.
+
+        Returns:
+            due (bool) -> Verdadeiro se o quadro atual deve ser desenhado.
+        '''
+
+        self.frame_count += 1
+        if self.requested: return True
+        if self.headless or self.every <= 0: return False
+
+        return (self.frame_count - 1) % self.every == 0
+
+    def show(self, image):
+        '''
+        Exibe o quadro desenhado na janela ou o salva em arquivo no modo sem display.
+
+        Inputs:
+            image (array) -> Quadro de saída já desenhado.
+        '''
+
+        if self.headless: cv2.imwrite(self.snapshot_path, image)
+        else: cv2.imshow(winname = self.window_name, mat = image)
+
+        self.rendered += 1
+        self.requested = False
+
+    def poll_key(self):
+        '''
+        Lê a tecla pressionada pelo usuário (sempre -1 no modo sem display).
+
+        Returns:
+            key (int) -> Código da tecla pressionada ou -1.
+        '''
+
+        if self.headless: return -1
+        return cv2.waitKey(delay = 1)
+
+    def close(self):
+        '''
+        Fecha a janela de exibição.
+        '''
+
+        if not self.headless: cv2.destroyAllWindows()